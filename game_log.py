@@ -0,0 +1,185 @@
+"""
+game_log.py
+
+Append-only binary log of game records, with a streaming reader
+and SGF export.
+
+    python3 game_log.py game_records.log
+    python3 game_log.py game_records.log --sgf games/
+
+The log starts with the 8 byte header LOG_MAGIC, followed by one record
+per game: a uint32 length of the rest of the record, then
+    board size, winner color, flags (uint8 each), number of moves (uint16)
+    black and white player names (uint8 length + utf-8 bytes each)
+    one MOVE_ROW per move
+All numbers are little endian. The length prefix lets a reader skip
+records, and an incomplete record at the end of the log (from an
+interrupted writer) is ignored.
+"""
+
+import argparse
+import os
+import struct
+import numpy as np
+
+LOG_MAGIC = b"NOGOGAM1"
+RECORD_LENGTH = struct.Struct("<I")
+RECORD_HEADER = struct.Struct("<BBBH")
+
+"""
+A move: its point as row * size + col (0-based, row 0 is row 1),
+the think time in seconds, and the search statistics reported by
+the engine, 0 if it reports none.
+"""
+MOVE_ROW = np.dtype([
+    ("point", "<u2"),
+    ("time", "<f4"),
+    ("sims", "<u4"),
+    ("winrate", "<f4"),
+])
+
+BLACK = 1
+WHITE = 2
+
+"""
+Record flags
+"""
+FLAG_TIMEOUT = 1
+
+COLUMNS = "ABCDEFGHJKLMNOPQRSTUVWXYZ"
+
+
+def coord_to_index(move, size):
+    """
+    Index of a GTP move like "C4" on a board of given size
+    """
+    col = COLUMNS.index(move[0].upper())
+    row = int(move[1:]) - 1
+    return row * size + col
+
+
+def index_to_coord(index, size):
+    """
+    GTP move of an index from coord_to_index
+    """
+    row, col = divmod(int(index), size)
+    return "{}{}".format(COLUMNS[col], row + 1)
+
+
+class GameRecord(object):
+    def __init__(self, size, black, white, winner, flags=0, moves=None):
+        """
+        A finished game.
+        moves is a numpy array of MOVE_ROW, black plays the first move.
+        """
+        self.size = size
+        self.black = black
+        self.white = white
+        self.winner = winner
+        self.flags = flags
+        if moves is None:
+            moves = np.zeros(0, dtype=MOVE_ROW)
+        self.moves = moves
+
+    def to_bytes(self):
+        names = b""
+        for name in (self.black, self.white):
+            data = name.encode("utf-8")[:255]
+            names += bytes([len(data)]) + data
+        body = RECORD_HEADER.pack(self.size, self.winner, self.flags, len(self.moves)) \
+            + names + self.moves.astype(MOVE_ROW).tobytes()
+        return RECORD_LENGTH.pack(len(body)) + body
+
+    @staticmethod
+    def from_bytes(body):
+        """
+        Decode a record without its length prefix
+        """
+        size, winner, flags, num_moves = RECORD_HEADER.unpack_from(body)
+        offset = RECORD_HEADER.size
+        names = []
+        for _ in range(2):
+            length = body[offset]
+            names.append(body[offset + 1 : offset + 1 + length].decode("utf-8"))
+            offset += 1 + length
+        moves = np.frombuffer(body, dtype=MOVE_ROW, count=num_moves, offset=offset)
+        return GameRecord(size, names[0], names[1], winner, flags, moves)
+
+    def to_sgf(self):
+        """
+        The game in SGF, with think times and search statistics
+        as move comments
+        """
+        letters = "abcdefghijklmnopqrstuvwxy"
+        result = "{}+R".format("B" if self.winner == BLACK else "W")
+        if self.flags & FLAG_TIMEOUT:
+            result = "{}+T".format("B" if self.winner == BLACK else "W")
+        sgf = "(;FF[4]GM[1]SZ[{}]PB[{}]PW[{}]RE[{}]".format(
+            self.size, self.black, self.white, result)
+        for i, move in enumerate(self.moves):
+            row, col = divmod(int(move["point"]), self.size)
+            # SGF rows count from the top
+            sgf += "\n;{}[{}{}]C[time {:.2f}s sims {} winrate {:.3f}]".format(
+                "B" if i % 2 == 0 else "W", letters[col], letters[self.size - 1 - row],
+                move["time"], move["sims"], move["winrate"])
+        return sgf + ")\n"
+
+
+def append_game(filename, record):
+    """
+    Append record to the log filename, creating it if needed
+    """
+    with open(filename, "ab") as f:
+        if f.tell() == 0:
+            f.write(LOG_MAGIC)
+        f.write(record.to_bytes())
+
+
+def read_games(filename):
+    """
+    Stream the records of the log filename, one GameRecord at a time
+    """
+    with open(filename, "rb") as f:
+        if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError("not a game log: {}".format(filename))
+        while True:
+            prefix = f.read(RECORD_LENGTH.size)
+            if len(prefix) < RECORD_LENGTH.size:
+                break
+            (length,) = RECORD_LENGTH.unpack(prefix)
+            body = f.read(length)
+            if len(body) < length:
+                break
+            yield GameRecord.from_bytes(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize or export a game log")
+    parser.add_argument("log")
+    parser.add_argument("--sgf", metavar="DIR", help="write one SGF file per game")
+    args = parser.parse_args()
+
+    games = moves = timeouts = 0
+    wins = {}
+    think = 0.0
+    for record in read_games(args.log):
+        if args.sgf:
+            os.makedirs(args.sgf, exist_ok=True)
+            path = os.path.join(args.sgf, "game{:06d}.sgf".format(games + 1))
+            with open(path, "w") as f:
+                f.write(record.to_sgf())
+        games += 1
+        moves += len(record.moves)
+        timeouts += record.flags & FLAG_TIMEOUT != 0
+        winner = record.black if record.winner == BLACK else record.white
+        wins[winner] = wins.get(winner, 0) + 1
+        think += float(record.moves["time"].sum())
+    print("games", games, "moves", moves, "timeouts", timeouts)
+    if moves:
+        print("average think time {:.3f}s".format(think / moves))
+    for player, count in sorted(wins.items()):
+        print("{} wins {}".format(player, count))
+
+
+if __name__ == "__main__":
+    main()
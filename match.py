@@ -0,0 +1,215 @@
+"""
+match.py
+
+In-process matches between engines, without GTP.
+
+    python3 match.py match ucb:sim=20 random --games 200
+    python3 match.py sweep ucb:sim=10 random --grid C=0.2,0.4,0.8 rave=0,500
+
+Engines are imported from ucb_player and play on one shared GoBoard.
+Games run in parallel in a pool of worker processes, and every worker
+keeps its engines between games.
+
+A player is given as NAME or NAME:KEY=VALUE,KEY=VALUE with the names
+    ucb     the UCB player, with the keys sim, C, rave, widening,
+            root_search, policy (1 to use the default playout weights) and
+            tablebase (1 to play won endgames from the default tablebase)
+    random  uniformly random legal moves, like the nogo4 NoGo player,
+            whose own board module cannot be imported next to ucb_player
+
+match plays player 1 against player 2 with alternating colors and
+reports the win rate of player 1 with a 95% confidence interval and
+the Elo difference. sweep does the same for every combination of the
+--grid values applied to player 1.
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ucb_player"))
+
+from board import GoBoard
+from board_util import GoBoardUtil, BLACK, WHITE
+from nogo_ucb import UCB
+from playout_policy import PlayoutPolicy
+from tablebase import Tablebase
+from random_stream import playout_random
+from match_stats import score_interval, elo_estimate
+
+
+class RandomPlayer(object):
+    def __init__(self):
+        self.name = "random"
+
+    def get_move(self, board, color):
+        return GoBoardUtil.generate_random_move(board, color)
+
+
+def make_ucb(params):
+    engine = UCB(
+        sim_num=int(params.get("sim", 10)),
+        coefficient=float(params.get("C", 0.4)),
+        policy=PlayoutPolicy.load_default() if params.get("policy", "0") == "1" else None,
+        rave=float(params.get("rave", 500)),
+        widening=params.get("widening", "1") == "1",
+        tablebase=Tablebase.load_default() if params.get("tablebase", "0") == "1" else None,
+    )
+    engine.set_root_search(params.get("root_search", "ucb"))
+    return engine
+
+
+ENGINES = {
+    "ucb": make_ucb,
+    "random": lambda params: RandomPlayer(),
+}
+
+
+def parse_spec(spec):
+    """
+    Return: (name, params) of a player spec NAME:KEY=VALUE,...
+    """
+    name, _, rest = spec.partition(":")
+    if name not in ENGINES:
+        raise ValueError("unknown engine: {}".format(name))
+    params = {}
+    for item in filter(None, rest.split(",")):
+        key, _, value = item.partition("=")
+        params[key] = value
+    return name, params
+
+
+def make_spec(name, params):
+    if not params:
+        return name
+    return name + ":" + ",".join("{}={}".format(k, v) for k, v in sorted(params.items()))
+
+
+"""
+Engines of a worker process, by spec
+"""
+_engines = {}
+
+
+def get_engine(spec):
+    if spec not in _engines:
+        name, params = parse_spec(spec)
+        _engines[spec] = ENGINES[name](params)
+    return _engines[spec]
+
+
+def play_game(black, white, size):
+    """
+    Play a game between the engines black and white on a shared board.
+    A player without a legal move, or that returns an illegal move, loses.
+    Returns the winner and the number of moves.
+    """
+    board = GoBoard(size)
+    players = {BLACK: black, WHITE: white}
+    num_moves = 0
+    while True:
+        color = board.current_player
+        if board.num_legal_moves(color) == 0:
+            break
+        move = players[color].get_move(board, color)
+        if move is None or not board.play_move(move, color):
+            break
+        num_moves += 1
+    return GoBoardUtil.opponent(color), num_moves
+
+
+def game_job(job):
+    """
+    Play game index of player1 against player2. Runs in a worker process.
+    Player 1 is black in even games. Returns (job key, player 1 won).
+    """
+    key, player1, player2, size, index, seed = job
+    playout_random.seed(seed)
+    engine1, engine2 = get_engine(player1), get_engine(player2)
+    if index % 2 == 0:
+        winner, _ = play_game(engine1, engine2, size)
+        return key, winner == BLACK
+    winner, _ = play_game(engine2, engine1, size)
+    return key, winner == WHITE
+
+
+def run_jobs(settings, opponent, games, size, workers, seed):
+    """
+    Play games for every player 1 spec in settings against opponent.
+    Returns wins of player 1 by spec.
+    """
+    jobs = [
+        (spec, spec, opponent, size, index, seed + n * games + index)
+        for n, spec in enumerate(settings)
+        for index in range(games)
+    ]
+    wins = dict((spec, 0) for spec in settings)
+    done = 0
+    with multiprocessing.Pool(workers) as pool:
+        for key, won in pool.imap_unordered(game_job, jobs):
+            wins[key] += won
+            done += 1
+            if done % 100 == 0:
+                print("{} / {} games".format(done, len(jobs)), file=sys.stderr, flush=True)
+    return wins
+
+
+def report(spec, wins, games):
+    low, high = score_interval(wins, games)
+    elo, elo_low, elo_high = elo_estimate(wins, games - wins)
+    print("{:<50} {:6d} / {:<6d} {:6.3f} [{:.3f}, {:.3f}]   Elo {:+7.1f} [{:+.1f}, {:+.1f}]".format(
+        spec, wins, games, wins / games, low, high, elo, elo_low, elo_high))
+
+
+def grid_settings(base, grid):
+    """
+    Specs of base with every combination of the grid values KEY=V1,V2,...
+    """
+    name, params = parse_spec(base)
+    keys = []
+    values = []
+    for item in grid:
+        key, _, options = item.partition("=")
+        keys.append(key)
+        values.append(options.split(","))
+    settings = []
+    for combination in itertools.product(*values):
+        setting = dict(params)
+        setting.update(zip(keys, combination))
+        settings.append(make_spec(name, setting))
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process engine matches")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command, help in (("match", "play player 1 against player 2"),
+                          ("sweep", "parameter grid for player 1 against player 2")):
+        sub = commands.add_parser(command, help=help)
+        sub.add_argument("player1")
+        sub.add_argument("player2")
+        sub.add_argument("--games", type=int, default=100, help="games per setting")
+        sub.add_argument("--size", type=int, default=7)
+        sub.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+        sub.add_argument("--seed", type=int, default=0)
+        if command == "sweep":
+            sub.add_argument("--grid", nargs="+", required=True, metavar="KEY=V1,V2")
+    args = parser.parse_args()
+
+    # check the specs before starting the workers
+    for spec in (args.player1, args.player2):
+        parse_spec(spec)
+    if args.command == "match":
+        settings = [args.player1]
+    else:
+        settings = grid_settings(args.player1, args.grid)
+    wins = run_jobs(settings, args.player2, args.games, args.size, args.workers, args.seed)
+    print("player 2: {}".format(args.player2))
+    for spec in settings:
+        report(spec, wins[spec], args.games)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+match_stats.py
+
+Statistics for engine matches: Elo estimates with confidence intervals
+and the sequential probability ratio test (SPRT).
+
+NoGo has no draws, so a match is a sequence of wins and losses of
+player 1, and the score of player 1 is its fraction of wins.
+"""
+
+import math
+
+"""
+z value of a two-sided 95% confidence interval
+"""
+Z_95 = 1.959964
+
+
+def elo_from_score(score):
+    """
+    Elo difference for an expected score, +-inf for a score of 1 or 0
+    """
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def score_from_elo(elo):
+    """
+    Expected score of a player that is elo stronger
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_interval(wins, games, z=Z_95):
+    """
+    Wilson score interval of the winning probability,
+    which stays inside [0, 1] also for few games or lopsided results
+    """
+    if games == 0:
+        return 0.0, 1.0
+    p = wins / games
+    denominator = 1 + z * z / games
+    center = (p + z * z / (2 * games)) / denominator
+    half = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / denominator
+    # exact bounds for all wins or all losses, which rounding can miss
+    low = 0.0 if wins == 0 else max(0.0, center - half)
+    high = 1.0 if wins == games else min(1.0, center + half)
+    return low, high
+
+
+def elo_estimate(wins, losses, z=Z_95):
+    """
+    Return: (elo, low, high)
+    Elo difference of player 1 and its confidence interval
+    """
+    games = wins + losses
+    if games == 0:
+        return 0.0, -math.inf, math.inf
+    low, high = score_interval(wins, games, z)
+    return elo_from_score(wins / games), elo_from_score(low), elo_from_score(high)
+
+
+class SPRT(object):
+    def __init__(self, elo0, elo1, alpha=0.05, beta=0.05):
+        """
+        Sequential probability ratio test of
+            H0: player 1 is elo0 stronger than player 2
+        against
+            H1: player 1 is elo1 stronger than player 2
+        with false positive rate alpha and false negative rate beta.
+        The test stops as soon as the log-likelihood ratio leaves
+        the interval (lower, upper).
+        """
+        assert elo0 < elo1
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.p0 = score_from_elo(elo0)
+        self.p1 = score_from_elo(elo1)
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+
+    def llr(self, wins, losses):
+        """
+        log-likelihood ratio of H1 against H0 after the games
+        """
+        return wins * math.log(self.p1 / self.p0) \
+            + losses * math.log((1 - self.p1) / (1 - self.p0))
+
+    def status(self, wins, losses):
+        """
+        Return: "H1" if H1 is accepted, "H0" if H0 is accepted,
+        None if more games are needed
+        """
+        llr = self.llr(wins, losses)
+        if llr >= self.upper:
+            return "H1"
+        if llr <= self.lower:
+            return "H0"
+        return None
+
+
+"""
+Game phases by move number, as fractions of the number of points
+"""
+PHASES = [("opening", 1 / 3), ("middle", 2 / 3), ("end", math.inf)]
+PERCENTILES = [50, 95, 99]
+
+
+def game_phase(move_number, num_points):
+    """
+    Name of the phase of the game at move_number (0-based)
+    """
+    for name, fraction in PHASES:
+        if move_number < fraction * num_points:
+            return name
+
+
+def percentile(values, q):
+    """
+    q-th percentile of the sorted list values, nearest rank
+    """
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[rank - 1]
+
+
+class LatencyProfile(object):
+    def __init__(self):
+        """
+        genmove latencies by engine and game phase.
+        latency is the wall-clock time from sending genmove to reading
+        the reply, think is the time the engine reports for it, and the
+        difference is the pipe and pexpect overhead.
+        """
+        self.samples = {}
+
+    def add(self, engine, phase, latency, think=None):
+        """
+        Record one genmove, think is None if the engine does not report it
+        """
+        samples = self.samples.setdefault((engine, phase), ([], [], []))
+        samples[0].append(latency)
+        if think is not None:
+            samples[1].append(think)
+            samples[2].append(max(0.0, latency - think))
+
+    def max_latency(self, engine):
+        return max(
+            (max(samples[0]) for (name, _), samples in self.samples.items() if name == engine),
+            default=0.0,
+        )
+
+    def engines(self):
+        return sorted(set(engine for engine, _ in self.samples))
+
+    def report(self):
+        """
+        Return: list of lines with the percentiles and the maximum in
+        milliseconds of the latency, think time and overhead, per engine
+        and phase, and for all phases of an engine
+        """
+        lines = ["{:<40} {:<8} {:<9} {:>6} {:>9} {:>9} {:>9} {:>9}".format(
+            "engine", "phase", "", "moves", "p50", "p95", "p99", "max")]
+        for engine in self.engines():
+            groups = [(phase, self.samples.get((engine, phase))) for phase, _ in PHASES]
+            total = ([], [], [])
+            for _, samples in groups:
+                if samples is not None:
+                    for values, more in zip(total, samples):
+                        values.extend(more)
+            groups.append(("all", total))
+            for phase, samples in groups:
+                if samples is None:
+                    continue
+                for label, values in zip(("latency", "think", "overhead"), samples):
+                    if not values:
+                        continue
+                    values = sorted(values)
+                    lines.append("{:<40} {:<8} {:<9} {:>6} {} {:9.1f}".format(
+                        engine, phase, label, len(values),
+                        " ".join("{:9.1f}".format(1000 * percentile(values, q))
+                                 for q in PERCENTILES),
+                        1000 * values[-1]))
+        return lines
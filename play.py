@@ -1,5 +1,10 @@
 
+import argparse
 import pexpect
+import time
+import numpy as np
+from game_log import GameRecord, append_game, coord_to_index, MOVE_ROW, FLAG_TIMEOUT
+from match_stats import SPRT, elo_estimate, LatencyProfile, game_phase
 
 # path to the two players
 # player 1 plays first
@@ -11,9 +16,18 @@ player2='nogo4/nogo4.py'
 win1=0
 win2=0
 numTimeout=0
+# SPRT decision, None if the test is off or undecided
+sprtResult=None
+# genmove latencies per engine and game phase
+latency=LatencyProfile()
 # time limit per move
 TIMEOUT=30
 SAFETY_MARGIN=1
+BOARDSIZE=7
+# warn when a genmove takes longer than this fraction of TIMEOUT
+LATENCY_WARNING=0.8
+# binary log of the full games, see game_log.py
+GAME_LOG='game_records.log'
 
 def getMove(p,color):
     '''
@@ -26,6 +40,28 @@ def getMove(p,color):
         return 'timeout'
     return p.after.decode("utf-8")[2:]
 
+def getStats(p):
+    '''
+    ask a player for the search statistics of its last genmove
+    return the number of simulations, the win rate and the think time,
+    zeros and None if the player does not support the command
+    '''
+    p.sendline('search_stats')
+    p.expect([pexpect.TIMEOUT,'= sims [0-9]+ winrate [0-9.]+[^\r\n]*\r?\n','\\? [^\r\n]*'])
+    if p.after==pexpect.TIMEOUT or not p.after.startswith(b'='):
+        return 0,0.0,None
+    fields=p.after.decode("utf-8").split()
+    think=float(fields[6]) if len(fields)>6 and fields[5]=='time' else None
+    return int(fields[2]),float(fields[4]),think
+
+def recordLatency(engine,moveNumber,elapsed,think):
+    '''
+    add a genmove to the latency profile, warn if it was close to TIMEOUT
+    '''
+    latency.add(engine,game_phase(moveNumber,BOARDSIZE*BOARDSIZE),elapsed,think)
+    if elapsed>LATENCY_WARNING*TIMEOUT:
+        print(f'Warning: {engine} took {elapsed:.2f}s of {TIMEOUT}s for move {moveNumber+1}')
+
 def playMove(p,color,move):
     '''
     send play command to the players
@@ -37,7 +73,7 @@ def setupPlayer(p):
     '''
     configure the players
     '''
-    p.sendline('boardsize 7')
+    p.sendline('boardsize {}'.format(BOARDSIZE))
     p.sendline('clear_board')
     p.sendline('timelimit {}'.format(TIMEOUT))
 
@@ -63,29 +99,44 @@ def playSingleGame(alternative=False):
     result=None
     istimeout=0
     sw=0
+    # move, think time, simulations and win rate of every move
+    record=[]
+    name1,name2=(player2,player1) if alternative else (player1,player2)
     while 1:
         if sw==0:
+            start=time.time()
             move=getMove(p1,'b')
+            elapsed=time.time()-start
             assert(move!='pass')
             if move=='resign':
                 result=2
                 break
             elif move=='timeout':
+                recordLatency(name1,len(record),elapsed,None)
                 result=2
                 istimeout=1
                 break
+            sims,winrate,think=getStats(p1)
+            recordLatency(name1,len(record),elapsed,think)
+            record.append((move,elapsed,sims,winrate))
             playMove(p2,'b',move)
             playMove(ob,'b',move)
         else:
+            start=time.time()
             move=getMove(p2,'w')
+            elapsed=time.time()-start
             assert(move!='pass')
             if move=='resign':
                 result=1
                 break
             elif move=='timeout':
+                recordLatency(name2,len(record),elapsed,None)
                 result=1
                 istimeout=1
                 break
+            sims,winrate,think=getStats(p2)
+            recordLatency(name2,len(record),elapsed,think)
+            record.append((move,elapsed,sims,winrate))
             playMove(p1,'w',move)
             playMove(ob,'w',move)
 
@@ -121,19 +172,31 @@ def playSingleGame(alternative=False):
 
     # print result
     print(f'Winner: {winner} Timeout: {istimeout}\n')
+    saveGame(record,alternative,result,istimeout)
     return result,istimeout
 
-def playGames(numGame=1):
+def saveGame(record,alternative,result,istimeout):
+    '''
+    append the moves of a game to the game log
+    '''
+    moves=np.zeros(len(record),dtype=MOVE_ROW)
+    for i,(move,elapsed,sims,winrate) in enumerate(record):
+        moves[i]=(coord_to_index(move,BOARDSIZE),elapsed,sims,winrate)
+    black,white=(player2,player1) if alternative else (player1,player2)
+    flags=FLAG_TIMEOUT if istimeout else 0
+    append_game(GAME_LOG,GameRecord(BOARDSIZE,black,white,result,flags,moves))
+
+def playGames(numGame=1,sprt=None):
     '''
     play the specified number of games with alternating turns
+    if sprt is given, stop as soon as the test accepts a hypothesis
     '''
-    global win1,win2,numTimeout
+    global win1,win2,numTimeout,sprtResult
 
     for i in range(0,numGame):
-        if(i<numGame/2):
-            alter=False
-        else:
-            alter=True
+        # player 1 plays black in even games and white in odd games,
+        # so an early stop leaves the colors balanced within one game
+        alter=i%2==1
         result,t=playSingleGame(alternative=alter)
         numTimeout+=t
         assert result==1 or result==2
@@ -142,9 +205,31 @@ def playGames(numGame=1):
         else:
             assert(result==1 and alter==True or result==2 and alter==False)
             win2+=1
+        if sprt is not None:
+            sprtResult=sprt.status(win1,win2)
+            print('SPRT llr {:.3f} bounds [{:.3f}, {:.3f}]'.format(
+                sprt.llr(win1,win2),sprt.lower,sprt.upper))
+            if sprtResult is not None:
+                break
+
+def eloSummary():
+    '''
+    Elo difference of player 1 with a 95% confidence interval
+    '''
+    elo,low,high=elo_estimate(win1,win2)
+    return 'Elo {:+.1f} [{:+.1f}, {:+.1f}]'.format(elo,low,high)
 
 def outputResult():
     print('Player1 wins',win1,'Player2 wins',win2, 'Timeouts', numTimeout)
+    print(eloSummary())
+    if sprtResult is not None:
+        print('SPRT accepted',sprtResult)
+    print('genmove times in ms')
+    for line in latency.report():
+        print(line)
+    for engine in latency.engines():
+        if latency.max_latency(engine)>LATENCY_WARNING*TIMEOUT:
+            print(f'Warning: {engine} came within {100*(1-LATENCY_WARNING):.0f}% of TIMEOUT')
 
 def saveResult():
     f = open("game_results.txt", "w")
@@ -152,8 +237,23 @@ def saveResult():
     f.write("player 2: {}\n".format(player2))
     f.write("player 1 wins: {}\n".format(win1))
     f.write("player 2 wins: {}\n".format(win2))
+    f.write("{}\n".format(eloSummary()))
+    if sprtResult is not None:
+        f.write("SPRT accepted: {}\n".format(sprtResult))
+    for line in latency.report():
+        f.write(line+"\n")
     f.close()
 
-playGames()
+parser=argparse.ArgumentParser(description='Play a match between player 1 and player 2')
+parser.add_argument('--games',type=int,default=1,help='number of games, the maximum with --sprt')
+parser.add_argument('--sprt',type=float,nargs=2,metavar=('ELO0','ELO1'),
+                    help='stop when H0: player 1 is ELO0 stronger or H1: it is ELO1 stronger is accepted')
+parser.add_argument('--alpha',type=float,default=0.05)
+parser.add_argument('--beta',type=float,default=0.05)
+args=parser.parse_args()
+sprt=None
+if args.sprt:
+    sprt=SPRT(args.sprt[0],args.sprt[1],args.alpha,args.beta)
+playGames(args.games,sprt)
 outputResult()
 saveResult()
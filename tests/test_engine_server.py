@@ -0,0 +1,55 @@
+"""
+The engine server over stdio, run as a subprocess
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import unittest
+
+UCB_PLAYER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ucb_player")
+
+"""
+Seconds before a test gives up on a response
+"""
+TIMEOUT = 30
+
+
+class EngineServerStdioTest(unittest.TestCase):
+    def test_genmove_with_open_stdin(self):
+        # stdin stays open while the first genmove forks the workers,
+        # so the reader thread is blocked in readline at that time
+        process = subprocess.Popen(
+            [sys.executable, "engine_server.py", "--workers", "1"],
+            cwd=UCB_PLAYER, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, text=True, start_new_session=True,
+        )
+        # kill the pool workers too, they keep stdout open
+        kill = lambda: os.killpg(process.pid, signal.SIGKILL)
+        timer = threading.Timer(TIMEOUT, kill)
+        timer.start()
+        try:
+            process.stdin.write("game1 num_sim 2\ngame1 genmove b\n")
+            process.stdin.flush()
+            responses = []
+            while len(responses) < 2:
+                line = process.stdout.readline()
+                if not line:
+                    break
+                if line.strip():
+                    responses.append(line.strip())
+            process.stdin.close()
+            process.wait()
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                kill()
+        self.assertEqual(len(responses), 2, "no genmove response before the timeout")
+        self.assertEqual(responses[0], "game1 =")
+        self.assertRegex(responses[1], r"^game1 = [A-G][1-7]$")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+Pondering of the GTP connection across the commands of a game
+"""
+
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+
+UCB_PLAYER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ucb_player")
+sys.path.insert(0, UCB_PLAYER)
+
+from board import GoBoard
+import gtp_connection
+from gtp_connection import GtpConnection
+from nogo_ucb import UCB
+from tablebase import Tablebase
+
+
+class RecordingConnection(GtpConnection):
+    """
+    GtpConnection that keeps its responses instead of writing them
+    """
+    def __init__(self, go_engine, board):
+        self.output = []
+        super().__init__(go_engine, board)
+
+    def write(self, data):
+        self.output.append(data)
+
+    def flush(self):
+        pass
+
+    def run_commands(self, *commands):
+        """
+        Handle the commands as lines read from stdin
+        """
+        lines = io.StringIO("".join(command + "\n" for command in commands))
+        with mock.patch.object(gtp_connection, "stdin", lines):
+            self.start_connection()
+
+
+class PonderingTest(unittest.TestCase):
+    def setUp(self):
+        board = GoBoard(7)
+        engine = UCB(sim_num=2, tablebase=Tablebase(7, 0))
+        self.con = RecordingConnection(engine, board)
+        self.addCleanup(self.con.stop_pondering)
+        self.con.run_commands("ponder on", "num_sim 2", "genmove b")
+        self.assertTrue(self.con.ponder_thread.is_alive())
+
+    def test_query_keeps_pondering(self):
+        thread = self.con.ponder_thread
+        for command in ("search_stats", "time_left b 10 0", "showboard",
+                        "gogui-rules_legal_moves"):
+            self.con.run_commands(command)
+            self.assertIs(self.con.ponder_thread, thread)
+            self.assertTrue(thread.is_alive())
+
+    def test_engine_setting_restarts_pondering(self):
+        thread = self.con.ponder_thread
+        self.con.run_commands("num_sim 3")
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(self.con.ponder_thread.is_alive())
+
+    def test_play_stops_pondering(self):
+        thread = self.con.ponder_thread
+        self.con.run_commands("play w A1")
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(self.con.ponder_thread)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+The search of the UCB player in worker processes
+"""
+
+import os
+import sys
+import unittest
+
+UCB_PLAYER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ucb_player")
+sys.path.insert(0, UCB_PLAYER)
+
+import numpy as np
+
+from board import GoBoard
+from board_util import BLACK
+from nogo_ucb import UCB, NUM, WINS, position_key
+from tablebase import Tablebase
+
+
+class SharedSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = UCB(sim_num=2, tablebase=Tablebase(7, 0))
+        self.addCleanup(self.engine.set_workers, 0)
+
+    def test_halving_refused_with_workers(self):
+        self.engine.set_workers(1)
+        with self.assertRaises(ValueError):
+            self.engine.set_root_search("halving")
+        self.assertEqual(self.engine.root_search, "ucb")
+
+    def test_workers_refused_with_halving(self):
+        self.engine.set_root_search("halving")
+        with self.assertRaises(ValueError):
+            self.engine.set_workers(1)
+        self.assertIsNone(self.engine.shared)
+
+    def test_pondered_counts_seed_the_workers(self):
+        board = GoBoard(7)
+        moves = self.engine.root_moves(board, BLACK)
+        stats = self.engine.new_stats(moves)
+        stats[-1, NUM] = 1000
+        stats[-1, WINS] = 900
+        self.engine.ponder_cache = {position_key(board, BLACK): (moves, stats)}
+        self.engine.set_workers(1)
+        num_sims = self.engine.num_simulations(board, moves)
+
+        move = self.engine.get_move(board, BLACK)
+
+        self.assertEqual(move, moves[-1])
+        root_stats = self.engine.root_stats
+        self.assertGreaterEqual(root_stats[-1, NUM], 1000)
+        self.assertGreaterEqual(root_stats[:, NUM].sum(), 1000 + num_sims)
+
+    def test_changed_settings_restart_workers(self):
+        board = GoBoard(7)
+        self.engine.set_workers(1)
+        shared = self.engine.shared
+        self.engine.get_move(board, BLACK)
+        self.assertIs(self.engine.shared, shared)
+
+        self.engine.set_sim_num(3)
+        self.engine.rave = 0
+        self.engine.get_move(board, BLACK)
+        self.assertIsNot(self.engine.shared, shared)
+        self.assertEqual(self.engine.shared.settings, self.engine.search_settings())
+        self.assertEqual(self.engine.shared.workers, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
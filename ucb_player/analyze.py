@@ -0,0 +1,218 @@
+#!/usr/bin/python3
+# /usr/bin/python3
+# Set the path to your python3 above
+
+"""
+analyze.py
+
+Batch analysis of saved positions.
+
+    python3 analyze.py positions.txt --sims 50 --workers 4 > results.jsonl
+
+The input has one position per line as a move list, black first,
+optionally with the board size:
+    C3 D4 E2
+    9: E5 D5
+or a board as printed by gogui-rules_board, one row per line from the
+top row down, with X, O and . for black, white and empty. Stones are
+never captured or passed in NoGo, so the player to move follows from
+the stone counts. Blank lines separate boards, and lines starting
+with # are ignored.
+
+Positions are evaluated in a pool of worker processes, and one JSON
+object per position is written to stdout in input order, with the best
+move, its estimated win rate for the player to move, the number of
+simulations, the most simulated moves and, if the exact solver finished,
+whether the player to move wins.
+
+Every worker keeps its caches across positions: the results of
+positions it already analyzed, and a Tablebase per board size, opened
+from the default tablebase file, with the positions the worker solved.
+Positions with at most --solve-limit legal moves for both players
+together are solved exactly by the tablebase solver.
+"""
+
+import argparse
+import json
+import multiprocessing
+import re
+import sys
+import numpy as np
+
+from board import GoBoard
+from board_util import GoBoardUtil, BLACK, WHITE, coord_to_point
+from gtp_connection import move_to_coord, point_to_coord, format_point
+from nogo_ucb import UCB, NUM, WINS, position_key
+from playout_policy import PlayoutPolicy
+from tablebase import Tablebase
+from random_stream import playout_random
+
+"""
+Number of most simulated moves listed per position
+"""
+TOP_MOVES = 5
+
+"""
+Node limit of one exact solve, it gives up beyond
+"""
+SOLVER_NODES = 200000
+
+BOARD_ROW = re.compile(r"^[XO.]+$")
+
+"""
+Worker state, created by init_worker and on demand
+"""
+_engine = None
+_results = {}
+_tablebases = {}
+
+
+def read_positions(stream, size):
+    """
+    Yield (text, size, moves or rows) for every position in stream,
+    moves for move lists and rows for boards
+    """
+    rows = []
+    for line in stream:
+        line = line.strip()
+        if BOARD_ROW.match(line):
+            rows.append(line)
+            continue
+        if rows:
+            yield "/".join(rows), len(rows), rows
+            rows = []
+        if not line or line.startswith("#"):
+            continue
+        text = line
+        move_size = size
+        if ":" in line:
+            prefix, line = line.split(":", 1)
+            move_size = int(prefix)
+        yield text, move_size, line.split()
+    if rows:
+        yield "/".join(rows), len(rows), rows
+
+
+def build_board(size, entries):
+    """
+    Return the GoBoard of a move list or board rows,
+    raises ValueError for an illegal position
+    """
+    board = GoBoard(size)
+    if entries and BOARD_ROW.match(entries[0]):
+        stones = {BLACK: [], WHITE: []}
+        for i, line in enumerate(entries):
+            if len(line) != size:
+                raise ValueError("row {} has length {}".format(i + 1, len(line)))
+            for col, c in enumerate(line):
+                if c != ".":
+                    point = coord_to_point(size - i, col + 1, size)
+                    stones[BLACK if c == "X" else WHITE].append(point)
+        num_black, num_white = len(stones[BLACK]), len(stones[WHITE])
+        if num_black - num_white not in (0, 1):
+            raise ValueError("{} black and {} white stones".format(num_black, num_white))
+        # without captures, the stones of a legal position
+        # can be played in any order
+        for color in (BLACK, WHITE):
+            for point in stones[color]:
+                if not board.play_move(point, color):
+                    raise ValueError("illegal position")
+        board.current_player = BLACK if num_black == num_white else WHITE
+        return board
+    for move in entries:
+        color = board.current_player
+        coord = move_to_coord(move, size)
+        if coord is None or not board.play_move(coord_to_point(coord[0], coord[1], size), color):
+            raise ValueError("illegal move {}".format(move))
+    return board
+
+
+def format_move(board, move):
+    return format_point(point_to_coord(move, board.size))
+
+
+def get_tablebase(size):
+    if size not in _tablebases:
+        _tablebases[size] = Tablebase.load_default(size)
+    return _tablebases[size]
+
+
+def init_worker(sims, use_policy):
+    global _engine
+    playout_random.seed()
+    policy = PlayoutPolicy.load_default() if use_policy else None
+    _engine = UCB(sim_num=sims, policy=policy)
+
+
+def analyze(job):
+    """
+    Analyze one position. Runs in a worker process.
+    """
+    index, text, size, entries, solve_limit = job
+    result = {"index": index, "position": text}
+    try:
+        board = build_board(size, entries)
+    except ValueError as e:
+        result["error"] = str(e)
+        return result
+    color = board.current_player
+    key = position_key(board, color)
+    if key in _results:
+        result.update(_results[key], cached=True)
+        return result
+
+    analysis = {"to_play": "b" if color == BLACK else "w"}
+    if board.num_legal_moves(color) == 0:
+        analysis.update(best_move=None, value=0.0, sims=0, solved="loss")
+    else:
+        solved = None
+        opp_color = GoBoardUtil.opponent(color)
+        if board.num_legal_moves(color) + board.num_legal_moves(opp_color) <= solve_limit:
+            solved = get_tablebase(size).solve_root(board, color, SOLVER_NODES)
+        move = _engine.get_move(board, color)
+        sims, value = _engine.get_search_stats()
+        stats = _engine.root_stats
+        top = []
+        if stats is not None:
+            moves = _engine.root_moves(board, color)
+            for i in np.argsort(-stats[:, NUM], kind="stable")[:TOP_MOVES]:
+                if stats[i, NUM] > 0:
+                    top.append({"move": format_move(board, moves[i]),
+                                "visits": int(stats[i, NUM]),
+                                "winrate": round(float(stats[i, WINS] / stats[i, NUM]), 4)})
+        if solved is not None:
+            win, winning_move = solved
+            analysis["solved"] = "win" if win else "loss"
+            if win:
+                move = winning_move
+        analysis.update(best_move=format_move(board, move), value=round(float(value), 4),
+                        sims=sims, top=top)
+    _results[key] = analysis
+    result.update(analysis, cached=False)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze positions in bulk")
+    parser.add_argument("positions", help="position file, - for stdin")
+    parser.add_argument("--size", type=int, default=7, help="board size of move lists")
+    parser.add_argument("--sims", type=int, default=20, help="simulations per root move")
+    parser.add_argument("--policy", action="store_true", help="use the playout policy")
+    parser.add_argument("--solve-limit", type=int, default=20,
+                        help="solve positions with at most this many legal moves")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    stream = sys.stdin if args.positions == "-" else open(args.positions)
+    jobs = (
+        (index, text, size, entries, args.solve_limit)
+        for index, (text, size, entries) in enumerate(read_positions(stream, args.size))
+    )
+    with multiprocessing.Pool(args.workers, initializer=init_worker,
+                              initargs=(args.sims, args.policy)) as pool:
+        for result in pool.imap(analyze, jobs, chunksize=4):
+            print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
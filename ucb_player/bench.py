@@ -0,0 +1,245 @@
+#!/usr/bin/python3
+# /usr/bin/python3
+# Set the path to your python3 above
+
+"""
+bench.py
+
+Benchmarks for the UCB player.
+
+    python3 bench.py widening --sizes 7 9 13 19
+    python3 bench.py sizes --sizes 7 9 13 19 25
+    python3 bench.py decided --sizes 5 7 9
+    python3 bench.py halving --budgets 2 4 8
+
+widening: genmove time, number of simulations and quality of the chosen
+move, with and without root pruning and progressive widening.
+The quality of a move is its win rate in --ref-sims uniform random
+simulations.
+
+sizes: per-move cost of the board core in uniform random games for a
+sweep of board sizes: generating and playing a move, and a flood fill
+of the block of the last move. The per-move cost should stay about
+constant as the size grows.
+
+decided: checks GoBoard.decided_winner along playouts without the early
+stop. Every position it calls decided is played out --continuations
+more times, and all of these games must end with the same winner.
+Reports the number of wrong calls, the plies saved by stopping at the
+first call and the time per playout.
+
+halving: quality of the move chosen by UCB and by sequential halving
+for budgets of --budgets simulations per root move, on the same
+positions and with the same move value as widening.
+"""
+
+import argparse
+import time
+
+from board import GoBoard
+from board_util import GoBoardUtil
+from nogo_ucb import UCB, play_game, ROOT_SEARCHES
+from random_stream import playout_random
+
+
+def random_position(size, num_moves):
+    """
+    Return a board after num_moves uniformly random moves,
+    or fewer if the game ends before.
+    """
+    board = GoBoard(size)
+    for _ in range(num_moves):
+        color = board.current_player
+        move = GoBoardUtil.generate_random_move(board, color)
+        if move is None:
+            break
+        board.play_move(move, color)
+    return board
+
+
+def test_positions(size, count, seed):
+    """
+    count random positions at about one quarter of the game
+    """
+    playout_random.seed(seed)
+    return [random_position(size, size * size // 4) for _ in range(count)]
+
+
+def move_value(board, move, color, num_sims):
+    """
+    win rate of move for color in num_sims uniform random simulations
+    """
+    wins = 0
+    for _ in range(num_sims):
+        cboard = board.copy()
+        cboard.play_move(move, color)
+        winner, _ = play_game(cboard)
+        wins += winner == color
+    return wins / num_sims
+
+
+def bench_widening(args):
+    print("size widening   ms/move   sims/move   move value")
+    for size in args.sizes:
+        positions = test_positions(size, args.positions, args.seed)
+        for widening in (False, True):
+            engine = UCB(args.sims, widening=widening)
+            elapsed = 0.0
+            sims = 0
+            value = 0.0
+            for board in positions:
+                color = board.current_player
+                sims += args.sims * len(engine.root_moves(board, color))
+                start = time.perf_counter()
+                move = engine.get_move(board, color)
+                elapsed += time.perf_counter() - start
+                value += move_value(board, move, color, args.ref_sims)
+            n = len(positions)
+            print("{:4d} {:>9} {:9.1f} {:11.0f} {:12.3f}".format(
+                size, str(widening), 1000 * elapsed / n, sims / n, value / n),
+                flush=True)
+
+
+def bench_sizes(args):
+    print("size   moves/game   us/genmove   us/play   us/floodfill   us/copy")
+    playout_random.seed(args.seed)
+    for size in args.sizes:
+        generate = play = fill = copy = 0.0
+        moves = 0
+        for _ in range(args.games):
+            board = GoBoard(size)
+            while True:
+                color = board.current_player
+                start = time.perf_counter()
+                move = GoBoardUtil.generate_random_move(board, color)
+                generate += time.perf_counter() - start
+                if move is None:
+                    break
+                start = time.perf_counter()
+                board.play_move(move, color)
+                play += time.perf_counter() - start
+                start = time.perf_counter()
+                board.connected_component(move)
+                fill += time.perf_counter() - start
+                moves += 1
+            start = time.perf_counter()
+            board.copy()
+            copy += time.perf_counter() - start
+        print("{:4d} {:12.1f} {:12.2f} {:9.2f} {:14.2f} {:9.2f}".format(
+            size, moves / args.games, 1e6 * generate / moves, 1e6 * play / moves,
+            1e6 * fill / moves, 1e6 * copy / args.games), flush=True)
+
+
+def bench_halving(args):
+    print("size   sims/move   " + "   ".join("{:>9}".format(name) for name in ROOT_SEARCHES))
+    for size in args.sizes:
+        positions = test_positions(size, args.positions, args.seed)
+        for budget in args.budgets:
+            values = []
+            for name in ROOT_SEARCHES:
+                engine = UCB(budget)
+                engine.set_root_search(name)
+                value = 0.0
+                for board in positions:
+                    color = board.current_player
+                    move = engine.get_move(board, color)
+                    value += move_value(board, move, color, args.ref_sims)
+                values.append(value / len(positions))
+            print("{:4d} {:11d}   {}".format(
+                size, budget, "   ".join("{:9.3f}".format(v) for v in values)), flush=True)
+
+
+def full_playout(board):
+    """
+    Play board to the end like play_game, without the early stop.
+    Returns the winner and the number of moves played.
+    """
+    num_moves = 0
+    while True:
+        color = board.current_player
+        move = GoBoardUtil.generate_random_move(board, color, use_eye_filter=True)
+        if move is None:
+            return GoBoardUtil.opponent(color), num_moves
+        board.play_move(move, color)
+        num_moves += 1
+
+
+def bench_decided(args):
+    print("size   plies/game   plies saved   wrong calls   ms/full   ms/early")
+    playout_random.seed(args.seed)
+    for size in args.sizes:
+        plies = saved = wrong = 0
+        for _ in range(args.games):
+            board = GoBoard(size)
+            calls = []
+            while True:
+                called = board.decided_winner()
+                if called is not None:
+                    calls.append(called)
+                    for _ in range(args.continuations):
+                        wrong += full_playout(board.copy())[0] != called
+                color = board.current_player
+                move = GoBoardUtil.generate_random_move(board, color, use_eye_filter=True)
+                if move is None:
+                    break
+                board.play_move(move, color)
+                plies += 1
+            winner = GoBoardUtil.opponent(board.current_player)
+            wrong += sum(called != winner for called in calls)
+            # the position after the last move is always decided
+            saved += len(calls) - 1
+        start = time.perf_counter()
+        for _ in range(args.games):
+            full_playout(GoBoard(size))
+        full = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(args.games):
+            play_game(GoBoard(size))
+        early = time.perf_counter() - start
+        print("{:4d} {:12.1f} {:13.2f} {:13d} {:9.2f} {:10.2f}".format(
+            size, plies / args.games, saved / args.games, wrong,
+            1000 * full / args.games, 1000 * early / args.games), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UCB player benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    widening = commands.add_parser("widening", help="root pruning and widening")
+    widening.add_argument("--sizes", type=int, nargs="+", default=[7, 9, 13, 19])
+    widening.add_argument("--positions", type=int, default=3)
+    widening.add_argument("--sims", type=int, default=2,
+                          help="simulations per root move")
+    widening.add_argument("--ref-sims", type=int, default=50)
+    widening.add_argument("--seed", type=int, default=0)
+    widening.set_defaults(run=bench_widening)
+
+    sizes = commands.add_parser("sizes", help="board core cost by board size")
+    sizes.add_argument("--sizes", type=int, nargs="+", default=[7, 9, 13, 19, 25])
+    sizes.add_argument("--games", type=int, default=20)
+    sizes.add_argument("--seed", type=int, default=0)
+    sizes.set_defaults(run=bench_sizes)
+
+    decided = commands.add_parser("decided", help="early decided game detection")
+    decided.add_argument("--sizes", type=int, nargs="+", default=[5, 7, 9])
+    decided.add_argument("--games", type=int, default=100)
+    decided.add_argument("--continuations", type=int, default=3,
+                         help="playouts from every decided position")
+    decided.add_argument("--seed", type=int, default=0)
+    decided.set_defaults(run=bench_decided)
+
+    halving = commands.add_parser("halving", help="sequential halving against UCB")
+    halving.add_argument("--sizes", type=int, nargs="+", default=[7])
+    halving.add_argument("--positions", type=int, default=20)
+    halving.add_argument("--budgets", type=int, nargs="+", default=[2, 4, 8],
+                         help="simulations per root move")
+    halving.add_argument("--ref-sims", type=int, default=100)
+    halving.add_argument("--seed", type=int, default=0)
+    halving.set_defaults(run=bench_halving)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
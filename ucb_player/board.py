@@ -22,19 +22,224 @@ from board_util import (
     coord_to_point,
     where1d,
     MAXSIZE,
-    GO_POINT
+    NULLPOINT,
+    GO_POINT,
+    BOARD_COLOR
 )
 
+"""
+Positions in a 3x3 pattern code, see BoardTopology.pattern_offsets
+"""
+ORTHOGONAL_POSITIONS = [1, 3, 4, 6]
+DIAGONAL_POSITIONS = [0, 2, 5, 7]
+
+
+def surrounded_table():
+    """
+    Return: numpy boolean array of shape (3, 4 ** 8)
+    surrounded_table()[color, code] tells whether all orthogonal
+    neighbors in the 3x3 pattern code are stones of color or border.
+    """
+    codes = np.arange(4 ** 8)
+    table = np.zeros((3, len(codes)), dtype=bool)
+    for color in (BLACK, WHITE):
+        surrounded = np.ones(len(codes), dtype=bool)
+        for position in ORTHOGONAL_POSITIONS:
+            neighbor = (codes >> (2 * position)) & 3
+            surrounded &= (neighbor == color) | (neighbor == BORDER)
+        table[color] = surrounded
+    return table
+
+
+SURROUNDED_TABLE = surrounded_table()
+
+
+def eye_table():
+    """
+    Return: numpy boolean array of shape (3, 4 ** 8)
+    eye_table()[color, code] tells whether the center of the 3x3
+    pattern code is a simple eye for color, with the same rule as
+    GoBoard.is_eye: surrounded by color, and at most one opponent
+    stone on the diagonals, none at the edge.
+    """
+    codes = np.arange(4 ** 8)
+    colors = [(codes >> (2 * position)) & 3 for position in range(8)]
+    at_edge = np.zeros(len(codes), dtype=bool)
+    for position in DIAGONAL_POSITIONS:
+        at_edge |= colors[position] == BORDER
+    table = np.zeros((3, len(codes)), dtype=bool)
+    for color in (BLACK, WHITE):
+        opp_color = GoBoardUtil.opponent(color)
+        false_count = sum(colors[position] == opp_color for position in DIAGONAL_POSITIONS)
+        table[color] = SURROUNDED_TABLE[color] & (false_count <= 1 - at_edge)
+    return table
+
+
+EYE_TABLE = eye_table()
+
+"""
+BoardTopology holds everything that depends only on the board size.
+It is computed once per size and shared by all boards of that size.
+"""
+class BoardTopology(object):
+    __slots__ = [
+        "size", "NS", "maxpoint", "empty_board", "points", "point_index",
+        "neighbors", "edges", "pattern_code", "pattern_targets", "pattern_increments",
+    ]
+
+    def __init__(self, size):
+        self.size = size
+        self.NS = size + 1
+        self.maxpoint = size * size + 3 * (size + 1)
+        self.empty_board = np.full(self.maxpoint, BORDER, dtype=BOARD_COLOR)
+        for row in range(1, size + 1):
+            start = row * self.NS + 1
+            self.empty_board[start : start + size] = EMPTY
+        self.points = [
+            point for point in range(self.maxpoint) if self.empty_board[point] == EMPTY
+        ]
+        self.point_index = [0] * self.maxpoint
+        for i, point in enumerate(self.points):
+            self.point_index[point] = i
+        self._initialize_neighbors()
+        self._initialize_patterns()
+
+    def _initialize_neighbors(self):
+        """
+        precompute neighbor array.
+        For each point on the board, store its list of on-the-board neighbors
+        """
+        NS = self.NS
+        self.neighbors = [[] for _ in range(self.maxpoint)]
+        for point in self.points:
+            self.neighbors[point] = [
+                nb for nb in (point - 1, point + 1, point - NS, point + NS)
+                if self.empty_board[nb] != BORDER
+            ]
+        # every pair of adjacent points once, as two arrays
+        edges = [(point, nb) for point in self.points
+                 for nb in self.neighbors[point] if nb > point]
+        self.edges = np.array(edges, dtype=np.intp).reshape(-1, 2).T
+
+    def pattern_offsets(self):
+        """ Offsets of the 8 points surrounding a point, row by row """
+        NS = self.NS
+        return [-NS - 1, -NS, -NS + 1, -1, 1, NS - 1, NS, NS + 1]
+
+    def _initialize_patterns(self):
+        """
+        Pattern codes of the empty board, and for each point the
+        points whose codes change when a stone is placed on it,
+        with the bit increment for a BLACK stone.
+        """
+        offsets = self.pattern_offsets()
+        self.pattern_code = np.zeros(self.maxpoint, dtype=np.int32)
+        targets = [[] for _ in range(self.maxpoint)]
+        increments = [[] for _ in range(self.maxpoint)]
+        for point in self.points:
+            code = 0
+            for k, offset in enumerate(offsets):
+                nb = point + offset
+                code |= int(self.empty_board[nb]) << (2 * k)
+                targets[nb].append(point)
+                increments[nb].append(1 << (2 * k))
+            self.pattern_code[point] = code
+        self.pattern_targets = [np.array(t, dtype=np.intp) for t in targets]
+        self.pattern_increments = [np.array(i, dtype=np.int32) for i in increments]
+
+
+_topologies = {}
+
+def board_topology(size):
+    """
+    Return the shared BoardTopology for size
+    """
+    if size not in _topologies:
+        _topologies[size] = BoardTopology(size)
+    return _topologies[size]
+
+
+class BlockLabels(object):
+    def __init__(self, board):
+        """
+        Label all blocks of stones and all empty regions of board.
+        label[point] is the id of the block or region of point, -1 on the
+        border. Per id: color, size, the smallest point as representative,
+        and liberties, the number of empty points next to a block (0 for
+        empty regions). adjacency lists each pair of adjacent ids (i, j)
+        with i < j once, as an array of shape (num_labels_adjacent, 2).
+
+        All points are labeled in one vectorized sweep: every point starts
+        with its own index, and the minimum is propagated along edges
+        between points of the same color, with pointer jumping, until
+        nothing changes.
+        """
+        colors = board.board
+        first, second = board.topology.edges
+        same = colors[first] == colors[second]
+        a, b = first[same], second[same]
+        root = np.arange(board.maxpoint)
+        while True:
+            new_root = root.copy()
+            np.minimum.at(new_root, a, root[b])
+            np.minimum.at(new_root, b, root[a])
+            new_root = new_root[new_root]
+            if np.array_equal(new_root, root):
+                break
+            root = new_root
+
+        points = np.array(board.topology.points, dtype=np.intp)
+        self.representative, inverse = np.unique(root[points], return_inverse=True)
+        self.num_labels = len(self.representative)
+        self.label = np.full(board.maxpoint, -1, dtype=np.int32)
+        self.label[points] = inverse
+        self.color = colors[self.representative]
+        self.size = np.bincount(inverse, minlength=self.num_labels)
+
+        # distinct (block, empty point) pairs give the liberties
+        label_first, label_second = self.label[first], self.label[second]
+        stone_first = colors[first] != EMPTY
+        stone_second = colors[second] != EMPTY
+        pairs = np.concatenate([
+            label_first[stone_first & ~stone_second].astype(np.int64) * board.maxpoint
+            + second[stone_first & ~stone_second],
+            label_second[stone_second & ~stone_first].astype(np.int64) * board.maxpoint
+            + first[stone_second & ~stone_first],
+        ])
+        self.liberties = np.bincount(
+            np.unique(pairs) // board.maxpoint, minlength=self.num_labels
+        )
+
+        low = np.minimum(label_first[~same], label_second[~same]).astype(np.int64)
+        high = np.maximum(label_first[~same], label_second[~same])
+        keys = np.unique(low * self.num_labels + high)
+        self.adjacency = np.stack([keys // self.num_labels, keys % self.num_labels], axis=1)
+
+
 """
 The GoBoard class implements a board and basic functions to play
 moves, check the end of the game, and count the acore at the end.
 The class also contains basic utility functions for writing a Go player.
 For many more utility functions, see the GoBoardUtil class in board_util.py.
 
-The board is stored as a one-dimensional array of GO_POINT in self.board.
+The board is stored as a one-dimensional array of BOARD_COLOR in self.board.
 See GoBoardUtil.coord_to_point for explanations of the array encoding.
+All per-size tables are shared through self.topology, so copying a board
+only copies its state. to_bytes and from_bytes convert a board to and
+from a compact encoding of a few dozen bytes.
 """
 class GoBoard(object):
+    __slots__ = [
+        "topology", "size", "NS", "WE", "maxpoint",
+        "last_move", "last2_move", "current_player", "board", "neighbors",
+        "empty_points", "empty_index",
+        "block", "liberties", "next_stone", "block_size",
+        "marker", "marker_stamp", "fill_stack", "fill_stones", "fill_liberties",
+        "legal", "legal_count", "self_atari",
+        "pattern_code", "pattern_targets", "pattern_increments", "eye",
+        "private", "private_count", "block_labels",
+    ]
+
     def __init__(self, size):
         """
         Creates a Go board of given size
@@ -46,27 +251,155 @@ class GoBoard(object):
         """
         Creates a start state, an empty board with given size.
         """
+        topology = board_topology(size)
+        self.topology = topology
         self.size = size
         self.NS = size + 1
         self.WE = 1
         self.last_move = None
         self.last2_move = None
         self.current_player = BLACK
-        self.maxpoint = size * size + 3 * (size + 1)
-        self.board = np.full(self.maxpoint, BORDER, dtype=GO_POINT)
-        self._initialize_empty_points(self.board)
+        self.maxpoint = topology.maxpoint
+        self.board = np.copy(topology.empty_board)
+        self.neighbors = topology.neighbors
+        self._initialize_empty_set()
+        self._initialize_blocks()
+        self._initialize_legal_moves()
+        self._initialize_patterns()
+
+    def _initialize_empty_set(self):
+        """
+        Indexed set of the empty points.
+        self.empty_points is a dense list of the empty points in any order,
+        self.empty_index[point] is the position of point in that list.
+        Playing a stone swaps the last entry into its slot.
+        """
+        self.empty_points = self.topology.points[:]
+        self.empty_index = self.topology.point_index[:]
+
+    def _initialize_blocks(self):
+        """
+        Blocks of stones are stored incrementally.
+        self.block maps each stone to the root point of its block.
+        self.liberties maps a root to the liberties of the block,
+        as a bitmask with bit p set for each liberty p.
+        self.next_stone links the stones of each block in a circular list,
+        so two blocks are merged in O(1) plus relabeling the smaller one.
+        self.block_size[root] is the number of stones in the block.
+        Stones are never removed in NoGo, so blocks only ever merge.
+        """
+        self.block = [NULLPOINT] * self.maxpoint
+        self.liberties = {}
+        self.next_stone = [NULLPOINT] * self.maxpoint
+        self.block_size = [0] * self.maxpoint
+        # generation-stamped marker and buffers for flood fills,
+        # allocated on first use
+        self.marker = None
+        self.marker_stamp = 0
+        # BlockLabels of the position, computed on demand
+        self.block_labels = None
+
+    def _initialize_legal_moves(self):
+        """
+        self.legal[color, point] caches whether color can play on point.
+        self.legal_count[color] is the number of legal moves for color.
+        On an empty board every point except the border is legal.
+        """
+        self.legal = np.zeros((3, self.maxpoint), dtype=bool)
+        empty = self.board == EMPTY
+        self.legal[BLACK] = empty
+        self.legal[WHITE] = empty
+        self.legal_count = [0, self.size * self.size, self.size * self.size]
+        self.self_atari = np.zeros((3, self.maxpoint), dtype=bool)
+        # self.private[color, point]: the empty point is surrounded by
+        # stones of color, so the opponent can never play there.
+        # self.private_count[color] is the number of these points.
+        self.private = np.zeros((3, self.maxpoint), dtype=bool)
+        self.private_count = [0, 0, 0]
+
+    def _initialize_patterns(self):
+        """
+        self.pattern_code[point] encodes the 3x3 neighborhood of point,
+        with 2 bits for the color of each of the 8 surrounding points
+        in the order of BoardTopology.pattern_offsets.
+        Placing a stone adds its color to the codes of the surrounding
+        points, using the precomputed target points and bit increments
+        in self.pattern_targets and self.pattern_increments.
+        self.eye[color, point] tracks whether point is an eye for color,
+        looked up from the pattern code in EYE_TABLE.
+        """
+        self.pattern_code = np.copy(self.topology.pattern_code)
+        self.pattern_targets = self.topology.pattern_targets
+        self.pattern_increments = self.topology.pattern_increments
+        self.eye = EYE_TABLE[:, self.pattern_code]
 
     def copy(self):
-        b = GoBoard(self.size)
-        assert b.NS == self.NS
-        assert b.WE == self.WE
+        b = GoBoard.__new__(GoBoard)
+        # the topology and its tables never change and are shared
+        b.topology = self.topology
+        b.size = self.size
+        b.NS = self.NS
+        b.WE = self.WE
+        b.maxpoint = self.maxpoint
+        b.neighbors = self.neighbors
+        b.pattern_targets = self.pattern_targets
+        b.pattern_increments = self.pattern_increments
         b.last_move = self.last_move
         b.last2_move = self.last2_move
         b.current_player = self.current_player
-        assert b.maxpoint == self.maxpoint
         b.board = np.copy(self.board)
+        b.empty_points = self.empty_points[:]
+        b.empty_index = self.empty_index[:]
+        b.block = self.block[:]
+        # liberty masks are immutable values
+        b.liberties = self.liberties.copy()
+        b.next_stone = self.next_stone[:]
+        b.block_size = self.block_size[:]
+        b.marker = None
+        b.marker_stamp = 0
+        b.block_labels = self.block_labels
+        b.legal = np.copy(self.legal)
+        b.legal_count = self.legal_count[:]
+        b.self_atari = np.copy(self.self_atari)
+        b.private = np.copy(self.private)
+        b.private_count = self.private_count[:]
+        b.pattern_code = np.copy(self.pattern_code)
+        b.eye = np.copy(self.eye)
         return b
 
+    def to_bytes(self):
+        """
+        Encode the position in a compact byte string:
+        size, current player, last two moves (0 for None)
+        and 2 bits per point for the colors of the points.
+        """
+        colors = self.board[self.topology.points]
+        packed = np.zeros((len(colors) + 3) // 4 * 4, dtype=np.uint8)
+        packed[: len(colors)] = colors
+        packed = packed.reshape(-1, 4)
+        packed = packed[:, 0] | packed[:, 1] << 2 | packed[:, 2] << 4 | packed[:, 3] << 6
+        header = bytes([self.size, self.current_player])
+        moves = [move if move is not None else 0 for move in (self.last_move, self.last2_move)]
+        header += np.array(moves, dtype="<u2").tobytes()
+        return header + packed.astype(np.uint8).tobytes()
+
+    @staticmethod
+    def from_bytes(data):
+        """
+        Restore a board encoded by to_bytes
+        """
+        board = GoBoard(data[0])
+        moves = np.frombuffer(data, dtype="<u2", count=2, offset=2)
+        packed = np.frombuffer(data, dtype=np.uint8, offset=6)
+        colors = np.stack([(packed >> shift) & 3 for shift in (0, 2, 4, 6)], axis=1).ravel()
+        points = board.topology.points
+        for i in np.flatnonzero(colors[: len(points)]):
+            board._place_stone(points[i], int(colors[i]))
+        board.current_player = data[1]
+        board.last_move = int(moves[0]) or None
+        board.last2_move = int(moves[1]) or None
+        return board
+
     def get_color(self, point):
         return self.board[point]
 
@@ -75,113 +408,209 @@ class GoBoard(object):
 
     def is_legal(self, point, color):
         """
-        Check whether it is legal for color to play on point
-        This method tries to play the move on a temporary copy of the board.
-        This prevents the board from being modified by the move
+        Check whether it is legal for color to play on point.
+        Uses the legal move cache, which play_move keeps up to date.
+        """
+        if point == PASS:
+            return False
+        return bool(self.legal[color, point])
+
+    def num_legal_moves(self, color):
+        """
+        Return:
+            The number of legal moves for color
+        """
+        return self.legal_count[color]
+
+    def get_legal_moves(self, color):
+        """
+        Return:
+            The legal moves for color
         """
-        board_copy = self.copy()
-        can_play_move = board_copy.play_move(point, color)
-        return can_play_move
+        return where1d(self.legal[color])
 
     def get_empty_points(self):
         """
         Return:
             The empty points on the board
         """
-        return where1d(self.board == EMPTY)
+        return np.array(self.empty_points, dtype=GO_POINT)
+
+    def num_empty_points(self):
+        return len(self.empty_points)
 
     def row_start(self, row):
         assert row >= 1
         assert row <= self.size
         return row * self.NS + 1
 
-    def _initialize_empty_points(self, board):
-        """
-        Fills points on the board with EMPTY
-        Argument
-        ---------
-        board: numpy array, filled with BORDER
-        """
-        for row in range(1, self.size + 1):
-            start = self.row_start(row)
-            board[start : start + self.size] = EMPTY
-
     def is_eye(self, point, color):
         """
         Check if point is a simple eye for color
         """
-        if not self._is_surrounded(point, color):
-            return False
-        # Eye-like shape. Check diagonals to detect false eye
-        opp_color = GoBoardUtil.opponent(color)
-        false_count = 0
-        at_edge = 0
-        for d in self._diag_neighbors(point):
-            if self.board[d] == BORDER:
-                at_edge = 1
-            elif self.board[d] == opp_color:
-                false_count += 1
-        return false_count <= 1 - at_edge  # 0 at edge, 1 in center
+        return bool(self.eye[color, point])
 
-    def _is_surrounded(self, point, color):
+    def get_candidate_mask(self, color, use_eye_filter):
         """
-        check whether empty point is surrounded by stones of color
-        (or BORDER) neighbors
+        Return: numpy boolean array
+        The legal moves for color, without its own eyes if use_eye_filter
         """
-        for nb in self._neighbors(point):
-            nb_color = self.board[nb]
-            if nb_color != BORDER and nb_color != color:
-                return False
-        return True
+        if use_eye_filter:
+            return self.legal[color] & ~self.eye[color]
+        return self.legal[color]
 
-    def _has_liberty(self, block):
+    def label_blocks(self):
         """
-        Check if the given block has any liberty.
-        block is a numpy boolean array
+        Return the BlockLabels of all blocks and empty regions.
+        The result is cached until the next move, and must not be modified.
         """
-        for stone in where1d(block):
-            empty_nbs = self.neighbors_of_color(stone, EMPTY)
-            if empty_nbs:
-                return True
-        return False
+        if self.block_labels is None:
+            self.block_labels = BlockLabels(self)
+        return self.block_labels
 
-    def _block_of(self, stone):
+    def connected_component(self, point):
         """
-        Find the block of given stone
-        Returns a board of boolean markers which are set for
-        all the points in the block
+        Find the connected component of the given point.
+        Returns an array of the points in the component, which is a
+        view into a buffer that is reused by the next flood fill.
         """
-        color = self.get_color(stone)
-        assert is_black_white(color)
-        return self.connected_component(stone)
+        stones, _ = self.flood_fill(point)
+        return stones
 
-    def connected_component(self, point):
+    def flood_fill(self, point):
         """
-        Find the connected component of the given point.
+        Find the block of stones or the empty region containing point.
+        Returns (stones, liberties): arrays of the points in the block
+        and of its empty neighbors, empty for a region.
+        Both are views into preallocated buffers, valid until the next
+        flood fill on this board. Nothing is allocated per call.
         """
-        marker = np.full(self.maxpoint, False, dtype=bool)
-        pointstack = [point]
+        marker, stamp = self._next_marker()
+        stack, stones, liberties = self.fill_stack, self.fill_stones, self.fill_liberties
         color = self.get_color(point)
         assert is_black_white_empty(color)
-        marker[point] = True
-        while pointstack:
-            p = pointstack.pop()
-            neighbors = self.neighbors_of_color(p, color)
-            for nb in neighbors:
-                if not marker[nb]:
-                    marker[nb] = True
-                    pointstack.append(nb)
-        return marker
-
-    def _detect_and_process_capture(self, nb_point):
-        """
-        Check whether opponent block on nb_point is captured.
-        Return a boolean
-        True: The block is captured
-        False: The block is not captured
-        """
-        opp_block = self._block_of(nb_point)
-        return not self._has_liberty(opp_block)
+        board = self.board
+        neighbors = self.neighbors
+        marker[point] = stamp
+        stack[0] = point
+        stones[0] = point
+        top = num_stones = 1
+        num_liberties = 0
+        while top:
+            top -= 1
+            p = stack[top]
+            for nb in neighbors[p]:
+                if marker[nb] == stamp:
+                    continue
+                nb_color = board[nb]
+                if nb_color == color:
+                    marker[nb] = stamp
+                    stack[top] = nb
+                    top += 1
+                    stones[num_stones] = nb
+                    num_stones += 1
+                elif nb_color == EMPTY:
+                    marker[nb] = stamp
+                    liberties[num_liberties] = nb
+                    num_liberties += 1
+        return stones[:num_stones], liberties[:num_liberties]
+
+    def has_any_liberty(self, point):
+        """
+        Check whether the block of the stone on point has a liberty.
+        Stops at the first empty neighbor instead of collecting the block.
+        """
+        marker, stamp = self._next_marker()
+        stack = self.fill_stack
+        color = self.get_color(point)
+        assert is_black_white(color)
+        board = self.board
+        neighbors = self.neighbors
+        marker[point] = stamp
+        stack[0] = point
+        top = 1
+        while top:
+            top -= 1
+            p = stack[top]
+            for nb in neighbors[p]:
+                nb_color = board[nb]
+                if nb_color == EMPTY:
+                    return True
+                if nb_color == color and marker[nb] != stamp:
+                    marker[nb] = stamp
+                    stack[top] = nb
+                    top += 1
+        return False
+
+    def _next_marker(self):
+        """
+        Return the marker array and a new stamp for a flood fill.
+        A point is marked if its marker entry equals the stamp,
+        so the marker never needs to be cleared.
+        The marker and the flood fill buffers are allocated on first use.
+        """
+        if self.marker is None:
+            self.marker = [0] * self.maxpoint
+            self.fill_stack = np.zeros(self.maxpoint, dtype=GO_POINT)
+            self.fill_stones = np.zeros(self.maxpoint, dtype=GO_POINT)
+            self.fill_liberties = np.zeros(self.maxpoint, dtype=GO_POINT)
+        self.marker_stamp += 1
+        return self.marker, self.marker_stamp
+
+    def safe_moves(self, color):
+        """
+        Lower bound on the number of moves color can still play
+        whatever the opponent does.
+        The opponent can never play on a private point of color. Private
+        points that touch a common block form a region, and color can
+        fill all points of a region but one, each fill keeping a liberty
+        on a point of the region that is still empty.
+        """
+        parent = {}
+
+        def find(root):
+            while parent[root] != root:
+                parent[root] = parent[parent[root]]
+                root = parent[root]
+            return root
+
+        points = where1d(self.private[color])
+        for point in points:
+            first = None
+            for nb in self.neighbors[point]:
+                root = self.block[nb]
+                if root not in parent:
+                    parent[root] = root
+                root = find(root)
+                if first is None:
+                    first = root
+                elif root != first:
+                    parent[root] = first
+        regions = len(set(find(root) for root in parent))
+        return len(points) - regions
+
+    def decided_winner(self):
+        """
+        Return the winner if the game is decided, None otherwise.
+        Illegal moves stay illegal in NoGo, so the opponent can play at
+        most its current number of legal moves. The player to move wins
+        if it has more safe moves than that, and loses if the opponent
+        has at least as many safe moves as the player has legal moves.
+        The private point counts bound the safe moves from above, so the
+        regions are only computed when the bound allows a decision.
+        """
+        color = self.current_player
+        opp_color = GoBoardUtil.opponent(color)
+        legal_count = self.legal_count
+        if legal_count[color] == 0:
+            return opp_color
+        if self.private_count[color] - 1 > legal_count[opp_color] \
+                and self.safe_moves(color) > legal_count[opp_color]:
+            return color
+        if self.private_count[opp_color] - 1 >= legal_count[color] \
+                and self.safe_moves(opp_color) >= legal_count[color]:
+            return opp_color
+        return None
 
     def play_move(self, point, color):
         """
@@ -193,32 +622,150 @@ class GoBoard(object):
         # Special cases
         if point == PASS:
             return False
-        elif self.board[point] != EMPTY:
-            return False
-
-        opp_color = GoBoardUtil.opponent(color)
-        self.board[point] = color
-        neighbors = self._neighbors(point)
-        # check for capturing
-        for nb in neighbors:
-            if self.board[nb] == opp_color:
-                captured = self._detect_and_process_capture(nb)
-                if captured:
-                    # undo capturing move
-                    self.board[point] = EMPTY
-                    return False
-
-        # check for suicide
-        block = self._block_of(point)
-        if not self._has_liberty(block):  # undo suicide move
-            self.board[point] = EMPTY
+        elif not self.legal[color, point]:
             return False
 
+        self._place_stone(int(point), color)
         self.current_player = GoBoardUtil.opponent(color)
         self.last2_move = self.last_move
         self.last_move = point
         return True
 
+    def _place_stone(self, point, color):
+        """
+        Put a stone of color on point, merge it with the adjacent blocks
+        of the same color, and update the legal move cache.
+        Only the liberties of blocks next to point can change legality,
+        so these are the only points that get re-evaluated.
+        """
+        board = self.board
+        block = self.block
+        liberties = self.liberties
+        board[point] = color
+        self.block_labels = None
+        self._remove_empty(point)
+        targets = self.pattern_targets[point]
+        self.pattern_code[targets] += self.pattern_increments[point] * color
+        self.eye[:, targets] = EYE_TABLE[:, self.pattern_code[targets]]
+        private = self.private
+        for c in (BLACK, WHITE):
+            if private[c, point]:
+                private[c, point] = False
+                self.private_count[c] -= 1
+        bit = 1 << point
+        libs = 0
+        affected = 0
+        roots = []
+        for nb in self.neighbors[point]:
+            nb_color = board[nb]
+            if nb_color == EMPTY:
+                libs |= 1 << nb
+                if SURROUNDED_TABLE[color, self.pattern_code[nb]]:
+                    private[color, nb] = True
+                    self.private_count[color] += 1
+            else:
+                root = block[nb]
+                if nb_color == color:
+                    if root not in roots:
+                        roots.append(root)
+                elif liberties[root] & bit:
+                    liberties[root] &= ~bit
+                    affected |= liberties[root]
+
+        block[point] = point
+        self.next_stone[point] = point
+        self.block_size[point] = 1
+        liberties[point] = libs
+        new_root = point
+        for root in roots:
+            new_root = self._merge_blocks(new_root, root)
+        liberties[new_root] &= ~bit
+        libs = liberties[new_root]
+
+        legal = self.legal
+        for c in (BLACK, WHITE):
+            if legal[c, point]:
+                legal[c, point] = False
+                self.legal_count[c] -= 1
+        self._update_legality(affected | libs)
+
+    def _merge_blocks(self, root1, root2):
+        """
+        Merge two blocks by relabeling the smaller one and splicing
+        their stone lists. Returns the root of the merged block.
+        """
+        block = self.block
+        next_stone = self.next_stone
+        if self.block_size[root1] < self.block_size[root2]:
+            root1, root2 = root2, root1
+        stone = root2
+        while True:
+            block[stone] = root1
+            stone = next_stone[stone]
+            if stone == root2:
+                break
+        next_stone[root1], next_stone[root2] = next_stone[root2], next_stone[root1]
+        self.block_size[root1] += self.block_size[root2]
+        self.liberties[root1] |= self.liberties.pop(root2)
+        return root1
+
+    def _remove_empty(self, point):
+        """
+        Swap-remove point from the indexed empty point set
+        """
+        empty_points = self.empty_points
+        last = empty_points.pop()
+        if last != point:
+            index = self.empty_index[point]
+            empty_points[index] = last
+            self.empty_index[last] = index
+
+    def _update_legality(self, points):
+        """
+        Re-evaluate the cached legality and self-atari status of all
+        points in the bitmask points, for both colors.
+        """
+        legal = self.legal
+        legal_count = self.legal_count
+        self_atari = self.self_atari
+        while points:
+            low = points & -points
+            points ^= low
+            point = low.bit_length() - 1
+            for color in (BLACK, WHITE):
+                is_legal, is_self_atari = self._evaluate_move(point, color)
+                self_atari[color, point] = is_self_atari
+                if is_legal != legal[color, point]:
+                    legal[color, point] = is_legal
+                    legal_count[color] += 1 if is_legal else -1
+
+    def _evaluate_move(self, point, color):
+        """
+        Check from the block liberties whether color can play on
+        the empty point. In NoGo a move is illegal if it captures
+        an opponent block or if its own block has no liberty.
+        Returns (legal, self_atari), where self_atari estimates whether
+        the block of the new stone would be left with a single liberty.
+        Shared liberties are counted more than once in the estimate.
+        """
+        board = self.board
+        liberties = 0
+        for nb in self.neighbors[point]:
+            nb_color = board[nb]
+            if nb_color == EMPTY:
+                liberties += 1
+                continue
+            # point is always one of the liberties of a neighbor block,
+            # remove it and check what is left
+            libs = self.liberties[self.block[nb]]
+            libs &= libs - 1
+            if nb_color == color:
+                if libs:
+                    liberties += 1 if libs & (libs - 1) == 0 else 2
+            elif not libs:
+                return False, False
+        return liberties > 0, liberties == 1
+
     def neighbors_of_color(self, point, color):
         """ List of neighbors of point of given color """
         nbc = []
@@ -231,15 +778,6 @@ class GoBoard(object):
         """ List of all four neighbors of the point """
         return [point - 1, point + 1, point - self.NS, point + self.NS]
 
-    def _diag_neighbors(self, point):
-        """ List of all four diagonal neighbors of point """
-        return [
-            point - self.NS - 1,
-            point - self.NS + 1,
-            point + self.NS - 1,
-            point + self.NS + 1,
-        ]
-
     def last_board_moves(self):
         """
         Get the list of last_move and second last move.
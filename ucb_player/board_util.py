@@ -4,7 +4,7 @@ Utility functions for Go board.
 """
 
 import numpy as np
-import random
+from random_stream import playout_random
 
 """
 Encoding of colors on and off a Go board.
@@ -30,11 +30,23 @@ It is encoded as a 32-bit integer, using the numpy type.
 """
 GO_POINT = np.int32
 
+"""
+The colors of a board are stored in one byte per point.
+"""
+BOARD_COLOR = np.uint8
+
 """
 Encoding of special pass move
 """
 PASS = None
 
+"""
+Number of uniformly sampled empty points that generate_random_move
+tests against the legal move cache before it falls back to
+choosing from the full list of legal moves.
+"""
+RANDOM_MOVE_TRIES = 10
+
 """
 Encoding of "not a real point", used as a marker
 """
@@ -120,31 +132,43 @@ class GoBoardUtil(object):
         color : {'b','w'}
             the color to generate the move for.
         """
-        moves = board.get_empty_points()
-        legal_moves = []
-        for move in moves:
-            if board.is_legal(move, color):
-                legal_moves.append(move)
-        return legal_moves
+        return list(board.get_legal_moves(color))
 
     @staticmethod
-    def generate_random_move(board, color):
+    def generate_random_move(board, color, use_eye_filter=False):
         """
         Generate a random move.
         Return PASS if no move found
 
+        Uses rejection sampling: a uniformly chosen empty point is
+        accepted if it is legal, so a move costs O(1) expected time
+        while most empty points are legal, and allocates nothing.
+        With use_eye_filter, moves that fill an own eye are only
+        played if there is no other legal move.
+
         Arguments
         ---------
-        board : np.array
-            a 1-d array representing the board
+        board : GoBoard
+            the board to generate the move on
         color : BLACK, WHITE
             the color to generate the move for.
         """
-        moves = GoBoardUtil.generate_legal_moves(board, color)
-        if (len(moves) == 0):
+        if board.num_legal_moves(color) == 0:
             return None
-        # choose one legal move randomly
-        return random.choice(moves)
+        empty_points = board.empty_points
+        legal = board.legal
+        eye = board.eye
+        n = len(empty_points)
+        random = playout_random.random
+        for _ in range(RANDOM_MOVE_TRIES):
+            move = empty_points[int(random() * n)]
+            if legal[color, move] and not (use_eye_filter and eye[color, move]):
+                return move
+        # few candidates left, choose one from the full list
+        moves = where1d(board.get_candidate_mask(color, use_eye_filter))
+        if len(moves) == 0:
+            moves = board.get_legal_moves(color)
+        return playout_random.choice(moves)
 
     @staticmethod
     def generate_random_moves(board, use_eye_filter):
@@ -153,8 +177,8 @@ class GoBoardUtil(object):
         """
 
         color = board.current_player
-        legal_moves = GoBoardUtil.generate_legal_moves(board, color)
-        random.shuffle(legal_moves)
+        legal_moves = list(where1d(board.get_candidate_mask(color, use_eye_filter)))
+        playout_random.shuffle(legal_moves)
 
         return legal_moves
 
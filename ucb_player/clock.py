@@ -0,0 +1,118 @@
+"""
+clock.py
+
+Game clock for the GTP time control commands time_settings and
+time_left, with Canadian byo-yomi: main_time seconds for the game,
+then byo_yomi_time seconds for each period of byo_yomi_stones moves.
+A byo_yomi_time of 0 means sudden death after the main time.
+
+ClockManager spreads the remaining time over the expected number of
+remaining moves, and gives more time to the middle game, where moves
+decide most games.
+"""
+
+"""
+Seconds kept back for the GTP round trip of every move
+"""
+MOVE_OVERHEAD = 0.3
+
+"""
+Never plan fewer remaining moves than this, to keep a reserve
+"""
+MIN_REMAINING_MOVES = 3
+
+"""
+The planned time of a move is multiplied by up to 1 + MIDGAME_BONUS,
+most when the board is half full
+"""
+MIDGAME_BONUS = 0.5
+
+"""
+Never plan more than this share of the remaining main time for one move
+"""
+MAX_MAIN_SHARE = 0.25
+
+
+class ClockManager(object):
+    def __init__(self):
+        """
+        No time settings: moves use the per-move time limit of the GTP
+        connection until time_settings is called.
+        """
+        self.active = False
+        self.main_time = 0.0
+        self.byo_yomi_time = 0.0
+        self.byo_yomi_stones = 0
+        # remaining time and stones of the current period, by color
+        self.time_left = {}
+        self.stones_left = {}
+
+    def time_settings(self, main_time, byo_yomi_time, byo_yomi_stones):
+        """
+        Start a new clock, with the same settings for both players.
+        byo_yomi_time > 0 with byo_yomi_stones == 0 means no time limit.
+        """
+        self.active = not (byo_yomi_time > 0 and byo_yomi_stones == 0)
+        self.main_time = main_time
+        self.byo_yomi_time = byo_yomi_time
+        self.byo_yomi_stones = byo_yomi_stones
+        for color in (1, 2):
+            self.time_left[color] = main_time
+            self.stones_left[color] = 0
+
+    def set_time_left(self, color, seconds, stones):
+        """
+        Remaining time of color from time_left. stones is 0 in main time,
+        otherwise the moves left in the current byo-yomi period.
+        """
+        self.time_left[color] = seconds
+        self.stones_left[color] = stones
+
+    def use(self, color, seconds):
+        """
+        Account for a move of color that took seconds, for controllers
+        that do not send time_left
+        """
+        if not self.active:
+            return
+        self.time_left[color] -= seconds
+        if self.stones_left[color] > 0:
+            self.stones_left[color] -= 1
+            if self.stones_left[color] == 0:
+                self.time_left[color] = self.byo_yomi_time
+                self.stones_left[color] = self.byo_yomi_stones
+        elif self.time_left[color] <= 0 and self.byo_yomi_stones > 0:
+            self.time_left[color] = self.byo_yomi_time
+            self.stones_left[color] = self.byo_yomi_stones
+
+    def remaining_moves(self, board, color):
+        """
+        Estimate of the number of moves color still has to play.
+        Both players take moves from the points that are legal for them,
+        so the game lasts about as many plies as the average number of
+        legal moves, half of them ours.
+        """
+        opp_color = 3 - color
+        plies = (board.num_legal_moves(color) + board.num_legal_moves(opp_color)) / 2
+        return max(MIN_REMAINING_MOVES, plies / 2)
+
+    def move_time(self, board, color):
+        """
+        Seconds to spend on the next move of color, None without time settings
+        """
+        if not self.active:
+            return None
+        time_left = self.time_left[color]
+        stones_left = self.stones_left[color]
+        num_points = board.size * board.size
+        filled = 1 - board.num_empty_points() / num_points
+        bonus = 1 + MIDGAME_BONUS * 4 * filled * (1 - filled)
+        if stones_left > 0:
+            # in byo-yomi: share the period between its moves
+            return max(0.0, time_left / stones_left - MOVE_OVERHEAD)
+        seconds = time_left / self.remaining_moves(board, color) * bonus
+        seconds = min(seconds, time_left * MAX_MAIN_SHARE)
+        if self.byo_yomi_stones > 0:
+            # the main time can be used up, byo-yomi follows
+            seconds = max(seconds, self.byo_yomi_time / self.byo_yomi_stones)
+        return max(0.0, seconds - MOVE_OVERHEAD)
@@ -0,0 +1,324 @@
+#!/usr/bin/python3
+# /usr/bin/python3
+# Set the path to your python3 above
+
+"""
+engine_server.py
+
+Engine server that plays many independent games in one process.
+
+    python3 engine_server.py --workers 4
+    python3 engine_server.py --workers 4 --port 6000
+
+Every input line is a session ID followed by a GTP command
+    game17 boardsize 7
+    game17 genmove b
+and every response starts with the session ID
+    game17 = C3
+Sessions are created by their first command and removed by quit.
+A line with only "quit" stops the server. With --port, the server
+accepts TCP connections on localhost, each with its own sessions.
+
+Each session has its own GoBoard, clock and engine settings, and runs
+its commands in order. The searches of all sessions share one pool of
+worker processes, each with a long-lived UCB engine, so the tables,
+playout weights and playout rate are loaded and measured once.
+A genmove sends only the compact position from GoBoard.to_bytes.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import queue
+import socket
+import sys
+import threading
+import time
+
+from board import GoBoard
+from gtp_connection import GtpConnection, color_to_int
+from nogo_ucb import UCB, ROOT_SEARCHES
+from playout_policy import PlayoutPolicy
+from tablebase import Tablebase
+from random_stream import playout_random
+
+"""
+Engine of a worker process, created by init_worker
+"""
+_engine = None
+
+
+class Deadline(object):
+    def __init__(self, end):
+        """
+        Stop condition for a search, set at the time.time() value end
+        """
+        self.end = end
+
+    def is_set(self):
+        return time.time() >= self.end
+
+
+def init_worker():
+    global _engine
+    # forked workers start with the random state of the parent
+    playout_random.seed()
+    _engine = UCB(sim_num=100, policy=PlayoutPolicy.load_default(),
+                  tablebase=Tablebase.load_default())
+    _engine.calibrate(GoBoard(7))
+
+
+def search_move(data, color, settings, deadline):
+    """
+    Search the position data from GoBoard.to_bytes for color
+    with the session settings, until the time.time() value deadline.
+    The time the job waited in the pool counts, and the first root
+    move is returned if the deadline has already passed.
+    With a session seed, the playouts are seeded from it and the
+    number of stones, so they do not depend on the worker.
+    Runs in a worker process.
+    Returns the move and the search statistics.
+    """
+    board = GoBoard.from_bytes(data)
+    if settings.seed is not None:
+        stones = board.size * board.size - board.num_empty_points()
+        playout_random.seed([settings.seed, stones])
+    limit = deadline - time.time()
+    if limit <= 0:
+        moves = _engine.root_moves(board, color)
+        return (moves[0] if moves else None), 0, 0.0
+    _engine.sim = settings.sim
+    _engine.auto_budget = settings.auto_budget
+    _engine.root_search = settings.root_search
+    _engine.set_time_limit(limit)
+    move = _engine.get_move(board, color, Deadline(deadline))
+    sims, winrate = _engine.get_search_stats()
+    return move, sims, winrate
+
+
+class SessionEngine(object):
+    def __init__(self):
+        """
+        Engine settings of one session. The GTP commands of the session
+        change them, and the workers search with them.
+        """
+        self.name = "UCB"
+        self.version = 1.0
+        self.sim = 100
+        self.auto_budget = True
+        self.root_search = "ucb"
+        self.time_limit = None
+        self.seed = None
+        self.search_stats = (0, 0.0)
+
+    def set_sim_num(self, new_num):
+        self.sim = new_num
+        self.auto_budget = False
+
+    def set_time_limit(self, seconds):
+        self.time_limit = seconds
+
+    def set_root_search(self, name):
+        if name not in ROOT_SEARCHES:
+            raise ValueError("unknown root search: {}".format(name))
+        self.root_search = name
+
+    def set_seed(self, seed):
+        self.seed = seed
+
+    def set_workers(self, workers):
+        raise ValueError("the server searches in one shared worker pool")
+
+    def calibrate(self, board):
+        # the workers measure the playout rate
+        pass
+
+    def ponder(self, board, stop):
+        # workers only search for genmove
+        pass
+
+    def get_search_stats(self):
+        return self.search_stats
+
+
+class SessionConnection(GtpConnection):
+    def __init__(self, server, channel, session_id):
+        """
+        GTP connection of one session, with its output sent to channel
+        prefixed by session_id. genmove is searched by the server's
+        worker pool, and the commands after it wait for the result.
+        """
+        GtpConnection.__init__(self, SessionEngine(), GoBoard(7))
+        self.server = server
+        self.channel = channel
+        self.session_id = session_id
+        self.output = []
+        self.pending = collections.deque()
+        self.busy = False
+        self.closed = False
+
+    def write(self, data):
+        self.output.append(data)
+
+    def flush(self):
+        if self.output:
+            self.channel.send("{} {}".format(self.session_id, "".join(self.output)))
+            self.output = []
+
+    def genmove_cmd(self, args):
+        color = color_to_int(args[0].lower())
+        limit = self.move_time_limit(color)
+        self.go_engine.set_time_limit(limit)
+        self.busy = True
+        self.server.submit(self, color, limit)
+
+    def finish_genmove(self, move, color, seconds, sims, winrate):
+        self.busy = False
+        self.go_engine.search_stats = (sims, winrate)
+        self.play_genmove(move, color, seconds)
+
+    def quit_cmd(self, args):
+        self.respond()
+        self.closed = True
+
+
+class StdioChannel(object):
+    def send(self, text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+class SocketChannel(object):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def send(self, text):
+        try:
+            self.conn.sendall(text.encode("utf-8"))
+        except OSError:
+            # the client is gone, its sessions end at its EOF
+            pass
+
+
+class EngineServer(object):
+    def __init__(self, workers):
+        self.pool = concurrent.futures.ProcessPoolExecutor(workers, initializer=init_worker)
+        # the pool forks all its workers on the first job: do it before
+        # a reader thread holds the lock of stdin, which a forked child
+        # would wait for forever when it closes its stdin
+        self.pool.submit(int).result()
+        self.events = queue.Queue()
+        self.sessions = {}
+
+    def read_lines(self, channel, stream):
+        """
+        Reader thread: queue the lines of stream, then an EOF event
+        """
+        for line in stream:
+            self.events.put(("line", channel, line))
+        self.events.put(("eof", channel, None))
+
+    def listen(self, port):
+        """
+        Accept thread: one reader thread per TCP connection
+        """
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(("127.0.0.1", port))
+        listener.listen()
+        while True:
+            conn, _ = listener.accept()
+            stream = conn.makefile("r", encoding="utf-8")
+            threading.Thread(
+                target=self.read_lines, args=(SocketChannel(conn), stream), daemon=True
+            ).start()
+
+    def submit(self, session, color, limit):
+        """
+        Search the position of session in the worker pool
+        """
+        start = time.time()
+        future = self.pool.submit(
+            search_move, session.board.to_bytes(), color, session.go_engine, start + limit
+        )
+        future.add_done_callback(
+            lambda f: self.events.put(("done", session, (f, color, start)))
+        )
+
+    def run_pending(self, session):
+        """
+        Run the queued commands of session until one waits for a search
+        """
+        while session.pending and not session.busy and not session.closed:
+            command = session.pending.popleft()
+            try:
+                session.get_cmd(command)
+            except Exception as e:
+                session.error("Error: {}".format(e))
+        if session.closed:
+            self.sessions.pop((session.channel, session.session_id), None)
+
+    def handle_line(self, channel, line):
+        elements = line.split(None, 1)
+        if len(elements) < 2:
+            if elements:
+                channel.send("? Usage: SESSION COMMAND\n\n")
+            return
+        key = (channel, elements[0])
+        session = self.sessions.get(key)
+        if session is None:
+            session = SessionConnection(self, channel, elements[0])
+            self.sessions[key] = session
+        session.pending.append(elements[1])
+        self.run_pending(session)
+
+    def handle_done(self, session, future, color, start):
+        try:
+            move, sims, winrate = future.result()
+        except Exception as e:
+            session.busy = False
+            session.error("Error: {}".format(e))
+        else:
+            session.finish_genmove(move, color, time.time() - start, sims, winrate)
+        self.run_pending(session)
+
+    def serve(self, port=None):
+        stdin_open = port is None
+        if port is None:
+            threading.Thread(
+                target=self.read_lines, args=(StdioChannel(), sys.stdin), daemon=True
+            ).start()
+        else:
+            threading.Thread(target=self.listen, args=(port,), daemon=True).start()
+        while True:
+            if not stdin_open and port is None and not any(
+                session.busy or session.pending for session in self.sessions.values()
+            ):
+                break
+            kind, source, data = self.events.get()
+            if kind == "line":
+                if data.strip() == "quit":
+                    break
+                self.handle_line(source, data)
+            elif kind == "done":
+                self.handle_done(source, *data)
+            elif isinstance(source, StdioChannel):
+                stdin_open = False
+            else:
+                # a TCP client disconnected
+                for key in [key for key in self.sessions if key[0] is source]:
+                    self.sessions[key].closed = True
+                    del self.sessions[key]
+        self.pool.shutdown(cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-session NoGo engine server")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, help="listen on this localhost port instead of stdin")
+    args = parser.parse_args()
+    EngineServer(args.workers).serve(args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ at the University of Edinburgh.
 """
 import traceback
 import signal
+import threading
+import time
 from sys import stdin, stdout, stderr
 from board_util import (
     GoBoardUtil,
@@ -19,8 +21,25 @@ from board_util import (
     MAXSIZE,
     coord_to_point,
 )
+from clock import ClockManager
 import re
 
+"""
+Shortest time limit of a genmove, in seconds
+"""
+MIN_MOVE_TIME = 0.1
+
+"""
+Commands that change the position or need the engine to themselves:
+pondering stops before them. After the engine settings, it starts
+again on the same position. Other commands, like the queries
+search_stats, time_left, showboard and gogui-*, run while the engine
+ponders.
+"""
+POSITION_COMMANDS = {"play", "genmove", "undo", "clear_board", "boardsize", "quit"}
+ENGINE_COMMANDS = {"komi", "seed", "workers", "num_sim", "timelimit",
+                   "root_search", "ponder"}
+
 class GtpConnection:
     def __init__(self, go_engine, board, debug_mode=False):
         """
@@ -37,6 +56,14 @@ class GtpConnection:
         self.go_engine = go_engine
         self.board = board
         self.timelimit = 30
+        # seconds spent in the last genmove
+        self.genmove_time = 0.0
+        # game clock from time_settings, replaces timelimit when active
+        self.clock = ClockManager()
+        self.pondering = False
+        self.ponder_thread = None
+        self.ponder_stop = threading.Event()
+        self.go_engine.set_time_limit(self.timelimit)
         signal.signal(signal.SIGALRM, self.handler)
         self.commands = {
             "protocol_version": self.protocol_version_cmd,
@@ -54,7 +81,14 @@ class GtpConnection:
             "gogui-rules_legal_moves":self.gogui_rules_legal_moves_cmd,
             "gogui-rules_final_result":self.gogui_rules_final_result_cmd,
             "num_sim": self.num_sim_cmd,
-            "timelimit": self.time_limit_cmd
+            "timelimit": self.time_limit_cmd,
+            "ponder": self.ponder_cmd,
+            "workers": self.workers_cmd,
+            "search_stats": self.search_stats_cmd,
+            "root_search": self.root_search_cmd,
+            "time_settings": self.time_settings_cmd,
+            "time_left": self.time_left_cmd,
+            "seed": self.seed_cmd
         }
 
         # used for argument checking
@@ -67,6 +101,12 @@ class GtpConnection:
             "genmove": (1, "Usage: genmove {w,b}"),
             "play": (2, "Usage: play {b,w} MOVE"),
             "legal_moves": (1, "Usage: legal_moves {w,b}"),
+            "ponder": (1, "Usage: ponder {on,off}"),
+            "workers": (1, "Usage: workers INT"),
+            "root_search": (1, "Usage: root_search {ucb,halving}"),
+            "time_settings": (3, "Usage: time_settings MAIN_TIME BYO_YOMI_TIME BYO_YOMI_STONES"),
+            "time_left": (3, "Usage: time_left {w,b} TIME STONES"),
+            "seed": (1, "Usage: seed INT"),
         }
 
     def write(self, data):
@@ -106,8 +146,16 @@ class GtpConnection:
             return
         # print(command_name in self.commands, command_name)
         if command_name in self.commands:
+            restart = False
+            if command_name in POSITION_COMMANDS:
+                self.stop_pondering()
+            elif command_name in ENGINE_COMMANDS:
+                restart = self.ponder_thread is not None
+                self.stop_pondering()
             try:
                 self.commands[command_name](args)
+                if restart:
+                    self.start_pondering()
             except Exception as e:
                 self.debug_msg("Error executing command {}\n".format(str(e)))
                 self.debug_msg("Stack Trace:\n{}\n".format(traceback.format_exc()))
@@ -115,7 +163,7 @@ class GtpConnection:
         else:
             self.debug_msg("Unknown command: {}\n".format(command_name))
             self.error("Unknown command")
-            stdout.flush()
+            self.flush()
 
     def has_arg_error(self, cmd, argnum):
         """
@@ -135,19 +183,24 @@ class GtpConnection:
 
     def error(self, error_msg):
         """ Send error msg to stdout """
-        stdout.write("? {}\n\n".format(error_msg))
-        stdout.flush()
+        self.write("? {}\n\n".format(error_msg))
+        self.flush()
 
     def respond(self, response=""):
         """ Send response to stdout """
-        stdout.write("= {}\n\n".format(response))
-        stdout.flush()
+        self.write("= {}\n\n".format(response))
+        self.flush()
 
     def reset(self, size):
         """
         Reset the board to empty board of given size
         """
         self.board.reset(size)
+        self.go_engine.calibrate(self.board)
+        if self.clock.active:
+            # a new game starts with full clocks
+            self.clock.time_settings(self.clock.main_time, self.clock.byo_yomi_time,
+                                     self.clock.byo_yomi_stones)
 
     def board2d(self):
         return str(GoBoardUtil.get_twoD_board(self.board))
@@ -275,10 +328,8 @@ class GtpConnection:
         get the game result: unknown, white or black
         '''
 
-        # get legal moves
-        legal_moves = GoBoardUtil.generate_legal_moves(self.board, self.board.current_player)
         # undetermined yet
-        if len(legal_moves) > 0:
+        if self.board.num_legal_moves(self.board.current_player) > 0:
             self.respond('unknown')
         # The current player is lost
         else:
@@ -328,18 +379,40 @@ class GtpConnection:
 
         board_color = args[0].lower()
         color = color_to_int(board_color)
+        start = time.time()
+        limit = self.move_time_limit(color)
+        self.go_engine.set_time_limit(limit)
 
         try:
-            signal.alarm(self.timelimit)
+            signal.setitimer(signal.ITIMER_REAL, limit)
             self.sboard = self.board.copy()
             move = self.go_engine.get_move(self.board, color)
             self.board=self.sboard
-            signal.alarm(0)
+            signal.setitimer(signal.ITIMER_REAL, 0)
         except Exception as e:
             # Time's up! Use the best move so far.
             move=self.go_engine.get_best_move()
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
 
+        self.play_genmove(move, color, time.time() - start)
+
+    def move_time_limit(self, color):
+        '''
+        seconds for the next move of color, from the clock if
+        time_settings was given, otherwise the timelimit
+        '''
+        limit = self.clock.move_time(self.board, color)
+        if limit is None:
+            limit = self.timelimit
+        return max(limit, MIN_MOVE_TIME)
 
+    def play_genmove(self, move, color, seconds):
+        '''
+        play and report the move the engine generated in seconds
+        '''
+        self.genmove_time = seconds
+        self.clock.use(color, seconds)
         # no move to play on the board
         if move is None:
             self.respond('resign')
@@ -351,6 +424,7 @@ class GtpConnection:
             # play that move
             self.board.play_move(move, color)
             self.respond(move_as_string)
+            self.start_pondering()
         else:
             self.respond("Illegal move: {}".format(move_as_string))
 
@@ -366,8 +440,134 @@ class GtpConnection:
         set time limit per move
         '''
         self.timelimit = int(args[0])
+        self.go_engine.set_time_limit(self.timelimit)
+        self.respond()
+
+    def time_settings_cmd(self, args):
+        '''
+        set the game clock: main time, then byo-yomi periods
+        of byo_yomi_time seconds for byo_yomi_stones moves
+        '''
+        try:
+            main_time, byo_yomi_time = float(args[0]), float(args[1])
+            byo_yomi_stones = int(args[2])
+        except ValueError:
+            self.error("Usage: time_settings MAIN_TIME BYO_YOMI_TIME BYO_YOMI_STONES")
+            return
+        self.clock.time_settings(main_time, byo_yomi_time, byo_yomi_stones)
+        self.respond()
+
+    def time_left_cmd(self, args):
+        '''
+        remaining time of a player, and its moves left in the byo-yomi
+        period, 0 in main time
+        '''
+        try:
+            color = color_to_int(args[0].lower()[0])
+            seconds, stones = float(args[1]), int(args[2])
+        except (KeyError, ValueError):
+            color = None
+        if color not in (BLACK, WHITE):
+            self.error("Usage: time_left {w,b} TIME STONES")
+            return
+        self.clock.set_time_left(color, seconds, stones)
+        self.respond()
+
+    def ponder_cmd(self, args):
+        '''
+        turn pondering on the opponent's time on or off
+        '''
+        if args[0] not in ("on", "off"):
+            self.error("Usage: ponder {on,off}")
+            return
+        self.pondering = args[0] == "on"
         self.respond()
 
+    def workers_cmd(self, args):
+        '''
+        set the number of worker processes of the search, 0 for none.
+        Workers run UCB, they are refused with root_search halving.
+        '''
+        try:
+            workers = int(args[0])
+        except ValueError:
+            workers = -1
+        if workers < 0:
+            self.error("Usage: workers INT, at least 0")
+            return
+        try:
+            self.go_engine.set_workers(workers)
+        except ValueError as e:
+            self.error(str(e))
+            return
+        self.respond()
+
+    def seed_cmd(self, args):
+        '''
+        seed the random numbers of the playouts. Runs are reproducible
+        with num_sim and without pondering, not with a time budget.
+        '''
+        try:
+            seed = int(args[0])
+        except ValueError:
+            seed = -1
+        if seed < 0:
+            self.error("Usage: seed INT, at least 0")
+            return
+        self.go_engine.set_seed(seed)
+        self.respond()
+
+    def root_search_cmd(self, args):
+        '''
+        select the root search algorithm of the engine.
+        halving is refused while there are workers.
+        '''
+        if args[0] not in ("ucb", "halving"):
+            self.error("Usage: root_search {ucb,halving}")
+            return
+        try:
+            self.go_engine.set_root_search(args[0])
+        except ValueError as e:
+            self.error(str(e))
+            return
+        self.respond()
+
+    def search_stats_cmd(self, args):
+        '''
+        number of simulations, win rate and think time of the last genmove
+        '''
+        sims, winrate = self.go_engine.get_search_stats()
+        self.respond("sims {} winrate {:.3f} time {:.4f}".format(
+            sims, winrate, self.genmove_time))
+
+    def start_pondering(self):
+        '''
+        let the engine search in a background thread
+        while we wait for the opponent's move
+        '''
+        if not self.pondering:
+            return
+        if self.board.num_legal_moves(self.board.current_player) == 0:
+            return
+        self.ponder_stop.clear()
+        self.ponder_thread = threading.Thread(
+            target=self.go_engine.ponder,
+            args=(self.board.copy(), self.ponder_stop),
+            daemon=True,
+        )
+        self.ponder_thread.start()
+
+    def stop_pondering(self):
+        '''
+        stop the background search, before a command that
+        changes the position or the engine
+        '''
+        if self.ponder_thread is None:
+            return
+        self.ponder_stop.set()
+        self.ponder_thread.join()
+        self.ponder_thread = None
+
     def handler(self, signum, fram):
         self.board = self.sboard
         raise Exception("unknown")
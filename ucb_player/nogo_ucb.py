@@ -5,30 +5,113 @@
 from gtp_connection import GtpConnection
 from board_util import GoBoardUtil
 from board import GoBoard
+from playout_policy import PlayoutPolicy
+from shared_search import SharedSearch
+from tablebase import Tablebase
+from random_stream import playout_random
 import numpy as np
+import time
 
 ##################### Global Helper Method##############
-def play_game(board:GoBoard):
+def play_game(board:GoBoard, policy:PlayoutPolicy=None, moves=None):
     """
     Run a simulation game to the end fromt the current board
+    Moves are uniformly random without filling own eyes,
+    or sampled from the playout policy if one is given.
+    The game stops as soon as GoBoard.decided_winner knows the winner.
+    If moves is given, the moves of the game are written into this
+    preallocated array, which needs room for every empty point.
+    Returns the winner and the number of moves played.
     """
+    num_moves = 0
     while True:
-        # play a random move for the current player
+        winner = board.decided_winner()
+        if winner is not None:
+            return winner, num_moves
+        # play a move for the current player
         color = board.current_player
-        move = GoBoardUtil.generate_random_move(board,color)
-        board.play_move(move, color)
+        if policy is None:
+            move = GoBoardUtil.generate_random_move(board,color,use_eye_filter=True)
+        else:
+            move = policy.generate_move(board,color)
 
         # current player is passing
         if move is None:
             break
 
+        board.play_move(move, color)
+        if moves is not None:
+            moves[num_moves] = move
+        num_moves += 1
+
     # get winner
     winner = GoBoardUtil.opponent(color)
-    return winner
+    return winner, num_moves
+
+def position_key(board:GoBoard, color):
+    """
+    Key identifying the position on board with color to play
+    """
+    return board.board.tobytes() + bytes([color])
 #################################################
 
+"""
+Pondering: number of most likely opponent replies to search after,
+and number of simulations per reply used to find them.
+"""
+PONDER_REPLIES = 5
+PONDER_REPLY_SIMS = 10
+
+"""
+Columns of the statistics of a move:
+number of simulations, wins, AMAF simulations and AMAF wins.
+AMAF (all moves as first) counts every simulation in which we played
+the move at any time, as if we had played it first.
+"""
+NUM, WINS, AMAF_NUM, AMAF_WINS = range(4)
+
+"""
+Default RAVE equivalence parameter: the number of simulations of a move
+at which its own value and its AMAF value get about the same weight.
+"""
+RAVE_EQUIVALENCE = 500
+
+"""
+Root move pruning and progressive widening.
+At most max(MIN_ROOT_MOVES, ROOT_MOVES_PER_LINE * size) moves are
+searched at the root, so the number of simulations grows with the
+board size rather than the board area. Moves are ordered by a cheap
+heuristic, and after N simulations only the first
+WIDEN_INITIAL + sqrt(N / WIDEN_RATE) moves can be selected.
+Filling an own eye lowers the heuristic score by EYE_PENALTY.
+"""
+MIN_ROOT_MOVES = 20
+ROOT_MOVES_PER_LINE = 6
+WIDEN_INITIAL = 8
+WIDEN_RATE = 4
+EYE_PENALTY = 10
+
+"""
+Automatic simulation budget: the share of the time limit a search
+plans to use, the seconds of playouts run to measure the playout rate
+at startup and on clear_board, and the weight of the old rate when a
+new measurement from a search is averaged in.
+"""
+TIME_SAFETY = 0.7
+CALIBRATION_TIME = 0.2
+RATE_SMOOTHING = 0.5
+
+"""
+Root search algorithms:
+ucb: UCB1 selection, which minimizes the cumulative regret
+halving: sequential halving, which aims at the best final move choice
+for a fixed budget
+"""
+ROOT_SEARCHES = ["ucb", "halving"]
+
 class UCB:
-    def __init__(self,sim_num,coefficient = 0.4):
+    def __init__(self,sim_num,coefficient = 0.4,policy = None,rave = RAVE_EQUIVALENCE,
+                 widening = True, tablebase = None):
         """
         NoGo player that selects moves according to
         flat Monte Carlo simulations with UCB.
@@ -39,24 +122,120 @@ class UCB:
             name of the player (used by the GTP interface).
         version : float
             version number (used by the GTP interface).
+        policy : PlayoutPolicy
+            policy for the simulations, None for uniform random playouts.
+        rave : float
+            RAVE equivalence parameter, 0 to select moves without AMAF.
+        widening : bool
+            prune and progressively widen the root moves.
+        tablebase : Tablebase
+            exact endgame results, None to search the endgame too.
         """
 
         self.name = "UCB"
         self.version = 1.0
         self.sim = sim_num
         self.C = coefficient
+        self.policy = policy
+        self.rave = rave
+        self.widening = widening
+        self.tablebase = tablebase
         self.best_move = None
+        # buffer for the moves of a simulation
+        self.playout_moves = np.zeros(0, dtype=np.intp)
+        # statistics from pondering, by position_key
+        self.ponder_cache = {}
+        # worker processes searching over shared memory, if any
+        self.shared = None
+        # statistics of the root moves of the last get_move
+        self.root_stats = None
+        # root search algorithm, see ROOT_SEARCHES
+        self.root_search = "ucb"
+        # the simulation budget follows the time limit, unless a fixed
+        # number of simulations was set with set_sim_num
+        self.auto_budget = True
+        self.time_limit = None
+        # measured playout speed, in empty points simulated per second
+        self.point_rate = None
     
     
     ################ Getters & Setters #########################
     def set_sim_num(self, new_num):
         '''
-        set new number of simulations
+        set new number of simulations, which turns off the
+        automatic budget
         '''
         self.sim = new_num
+        self.auto_budget = False
+
+    def set_time_limit(self, seconds):
+        '''
+        set the time limit per move for the automatic budget
+        '''
+        self.time_limit = seconds
     
+    def set_workers(self, workers):
+        '''
+        search with workers processes, or in this process if 0.
+        The workers run UCB, so they are refused while the root
+        search is halving.
+        '''
+        if workers > 0 and self.root_search == "halving":
+            raise ValueError("halving searches without workers, set workers 0")
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+        if workers > 0:
+            self.shared = SharedSearch(self, workers)
+
+    def set_seed(self, seed):
+        '''
+        restart the playout random numbers from seed, and the
+        workers with streams spawned from it. Moves only repeat with
+        a fixed number of simulations (set_sim_num) and no pondering,
+        the automatic budget depends on the measured time.
+        '''
+        playout_random.seed(seed)
+        if self.shared is not None:
+            self.set_workers(self.shared.workers)
+
+    def set_root_search(self, name):
+        '''
+        select the root search algorithm by name. Halving needs the
+        search in this process, it is refused while there are workers.
+        '''
+        if name not in ROOT_SEARCHES:
+            raise ValueError("unknown root search: {}".format(name))
+        if name == "halving" and self.shared is not None:
+            raise ValueError("halving searches without workers, set workers 0")
+        self.root_search = name
+
+    def search_settings(self):
+        '''
+        the settings of the search, the workers are restarted with
+        a copy of the engine when they change
+        '''
+        return (self.sim, self.C, self.rave, self.widening, self.policy, self.root_search)
+
     def get_best_move(self):
+        if self.shared is not None:
+            self.shared.stop()
+            self.root_stats = self.shared.counts()
+            move = self.shared.best_move()
+            if move is not None:
+                return move
         return self.best_move
+
+    def get_search_stats(self):
+        '''
+        number of simulations of the last get_move,
+        and the win rate of the most simulated move
+        '''
+        if self.root_stats is None or self.root_stats[:, NUM].sum() == 0:
+            return 0, 0.0
+        best = np.argmax(self.root_stats[:, NUM])
+        return int(self.root_stats[:, NUM].sum()), \
+            self.root_stats[best, WINS]/self.root_stats[best, NUM]
     ############################################################
     
     ############### Core UCB Monte Carlo Logics ################
@@ -67,85 +246,322 @@ class UCB:
         q = val/num
         return q + self.C*np.sqrt(np.log(N)/num)
 
-    
+    def compute_rave(self, stats, N):
+        '''
+        calculate the upper confidence bounds of all moves,
+        with the values blended with the AMAF values
+        '''
+        num = stats[:, NUM]
+        amaf_num = np.maximum(stats[:, AMAF_NUM], 1)
+        beta = np.sqrt(self.rave/(3*num + self.rave))
+        q = (1 - beta)*stats[:, WINS]/num + beta*stats[:, AMAF_WINS]/amaf_num
+        return q + self.C*np.sqrt(np.log(N)/num)
+
     def select(self, stats, N):
         '''
         select the move to simulate based on the stats
         '''
-        max_val = 0
-        max_index = 0
-        for index, (num, val) in enumerate(stats):
-            # never selected so far
-            if num == 0:
-                return index
-            # find the max ucb value and index
-            ucb = self.compute_ucb(num, val, N)
-            if ucb > max_val:
-                max_val = ucb
-                max_index = index
-        
-        return max_index
-            
+        unvisited = np.flatnonzero(stats[:, NUM] == 0)
+        # never selected so far
+        if len(unvisited) > 0:
+            return unvisited[0]
+        # find the max ucb value and index
+        if self.rave > 0:
+            return np.argmax(self.compute_rave(stats, N))
+        return np.argmax(self.compute_ucb(stats[:, NUM], stats[:, WINS], N))
+
     def simulate(self, board:GoBoard, move, toplay):
         """
         Simulate a game for a given move.
+        Returns the winner and the number of moves of the simulation,
+        which are stored in self.playout_moves.
         """
         cboard = board.copy()
         cboard.play_move(move, toplay)
-        return play_game(cboard)
+        if len(self.playout_moves) < cboard.maxpoint:
+            self.playout_moves = np.zeros(cboard.maxpoint, dtype=np.intp)
+        return play_game(cboard, self.policy, self.playout_moves)
+
+    def new_stats(self, moves):
+        '''
+        empty statistics for the moves
+        '''
+        return np.zeros((len(moves), 4))
     
-    def run_ucb(self, board:GoBoard, moves, color):
+    def simulate_move(self, board:GoBoard, moves, index, color, stats, move_index):
+        '''
+        Simulate a game after moves[index] and add the result to stats.
+        move_index maps each point to its index in moves, -1 for other points.
+        '''
+        winner, num_moves = self.simulate(board, moves[index], color)
+        win = winner == color
+        stats[index, NUM] += 1
+        stats[index, WINS] += win
+        if self.rave > 0:
+            # our moves are every second move, starting with the
+            # second one. Points are played at most once in NoGo,
+            # so the indices are unique.
+            played = move_index[self.playout_moves[1:num_moves:2]]
+            played = played[played >= 0]
+            stats[played, AMAF_NUM] += 1
+            stats[played, AMAF_WINS] += win
+            stats[index, AMAF_NUM] += 1
+            stats[index, AMAF_WINS] += win
+
+    def run_ucb(self, board:GoBoard, moves, color, stats=None, num_sims=None, stop=None):
         '''
         Run the flat MC algorithm for N = #moves x #simulations times
         with UCB for move selection at each iteration.
 
         The move to act in the real game is the one with the max
         simulation count.
+
+        stats can contain the results of earlier simulations for the same
+        moves, which are continued. num_sims overrides the number of
+        simulations, and the search stops early once the event stop is set.
         '''
-        total_sim = self.sim*len(moves)
+        if num_sims is None:
+            num_sims = self.sim*len(moves)
         # first dimension: corresponding the moves
-        # second dimension: [number of selection, total wins so far]
-        stats = np.zeros((len(moves),2))
+        # second dimension: the columns NUM, WINS, AMAF_NUM, AMAF_WINS
+        if stats is None:
+            stats = self.new_stats(moves)
+        done = int(stats[:, NUM].sum())
+        # index in moves of each point, -1 for other points
+        move_index = np.full(board.maxpoint, -1, dtype=np.intp)
+        move_index[moves] = np.arange(len(moves))
 
-        for N in range(1, total_sim+1):
+        for N in range(done+1, done+num_sims+1):
+            if stop is not None and stop.is_set():
+                break
             # select move to simulate
-            index = self.select(stats, N)
-            move = moves[index]
-            # simulate the game
-            winner = self.simulate(board, move, color)
-            if winner == color:
-                # increment both countings
-                stats[index] += 1
-            else:
-                # only increment number of selection
-                stats[index][0] += 1
+            index = self.select(stats[:self.width(N, len(moves))], N)
+            self.simulate_move(board, moves, index, color, stats, move_index)
             
             # move index with maximum count
-            max_index = np.argmax(stats,axis=0)[0]
+            max_index = np.argmax(stats[:, NUM])
             # update best move
             self.best_move = moves[max_index]
 
         return self.best_move
     
+    def run_halving(self, board:GoBoard, moves, color, stats=None, num_sims=None, stop=None):
+        '''
+        Sequential halving: split the budget of num_sims simulations
+        into log2(#moves) rounds. Each round gives every remaining move
+        the same number of simulations, then drops the worse half by
+        win rate. Returns the last remaining move.
+
+        Like run_ucb, stats can contain earlier simulations and the
+        search stops early once the event stop is set.
+        '''
+        if num_sims is None:
+            num_sims = self.sim*len(moves)
+        if stats is None:
+            stats = self.new_stats(moves)
+        move_index = np.full(board.maxpoint, -1, dtype=np.intp)
+        move_index[moves] = np.arange(len(moves))
+        active = np.arange(len(moves))
+        rounds = max(1, int(np.ceil(np.log2(len(moves)))))
+
+        while len(active) > 1:
+            per_move = max(1, num_sims//(len(active)*rounds))
+            for _ in range(per_move):
+                for index in active:
+                    if stop is not None and stop.is_set():
+                        return self.best_move
+                    self.simulate_move(board, moves, index, color, stats, move_index)
+                # best remaining move so far, in case time runs out
+                values = stats[active, WINS]/np.maximum(stats[active, NUM], 1)
+                self.best_move = moves[active[np.argmax(values)]]
+            values = stats[active, WINS]/np.maximum(stats[active, NUM], 1)
+            keep = (len(active) + 1)//2
+            active = active[np.argsort(-values, kind="stable")[:keep]]
+
+        self.best_move = moves[active[0]]
+        return self.best_move
+
+    ###############################################################
+
+    ##################### Root move ordering ######################
+    def score_moves(self, board:GoBoard, moves, color):
+        '''
+        Cheap heuristic scores of moves for color: the number of legal
+        moves it takes from the opponent minus the number of our own
+        legal moves it uses up, with a penalty for filling an own eye.
+        '''
+        opp_color = GoBoardUtil.opponent(color)
+        own_legal = board.num_legal_moves(color)
+        opp_legal = board.num_legal_moves(opp_color)
+        scores = np.zeros(len(moves))
+        for i, move in enumerate(moves):
+            cboard = board.copy()
+            cboard.play_move(move, color)
+            scores[i] = (opp_legal - cboard.num_legal_moves(opp_color)) \
+                - (own_legal - cboard.num_legal_moves(color))
+            if board.is_eye(move, color):
+                scores[i] -= EYE_PENALTY
+        return scores
+
+    def root_moves(self, board:GoBoard, color):
+        '''
+        The legal moves to search at the root.
+        With widening, the best moves by score_moves come first,
+        and the rest are pruned.
+        '''
+        moves = GoBoardUtil.generate_legal_moves(board, color)
+        if not self.widening or len(moves) < 2:
+            return moves
+        order = np.argsort(-self.score_moves(board, moves, color), kind="stable")
+        max_moves = max(MIN_ROOT_MOVES, ROOT_MOVES_PER_LINE*board.size)
+        return [moves[i] for i in order[:max_moves]]
+
+    def width(self, N, num_moves):
+        '''
+        number of moves that can be selected at simulation N
+        '''
+        if not self.widening:
+            return num_moves
+        return min(num_moves, WIDEN_INITIAL + int(np.sqrt(N/WIDEN_RATE)))
+    ###############################################################
+
+    ##################### Simulation budget #######################
+    def num_simulations(self, board:GoBoard, moves):
+        '''
+        number of simulations for a search of moves on board: sim per
+        move, or what fits into TIME_SAFETY of the time limit at the
+        measured playout rate. Playouts get shorter as the board fills,
+        so the rate is per empty point.
+        '''
+        if not self.auto_budget or self.time_limit is None or self.point_rate is None:
+            return self.sim*len(moves)
+        seconds = self.time_limit*TIME_SAFETY
+        return max(len(moves), int(seconds*self.point_rate/max(1, board.num_empty_points())))
+
+    def update_rate(self, board:GoBoard, num_sims, seconds):
+        '''
+        average the playout rate of num_sims simulations
+        from board in seconds into self.point_rate
+        '''
+        if num_sims == 0 or seconds <= 0:
+            return
+        rate = num_sims*max(1, board.num_empty_points())/seconds
+        if self.point_rate is None:
+            self.point_rate = rate
+        else:
+            self.point_rate = RATE_SMOOTHING*self.point_rate + (1 - RATE_SMOOTHING)*rate
+
+    def calibrate(self, board:GoBoard):
+        '''
+        measure the playout rate on board for CALIBRATION_TIME seconds
+        '''
+        color = board.current_player
+        moves = GoBoardUtil.generate_legal_moves(board, color)
+        if not moves:
+            return
+        num_sims = 0
+        start = time.time()
+        # the number of playouts depends on the time, keep them
+        # out of the seeded playout stream
+        with playout_random.detached():
+            while time.time() - start < CALIBRATION_TIME:
+                self.simulate(board, moves[num_sims % len(moves)], color)
+                num_sims += 1
+        self.update_rate(board, num_sims, time.time() - start)
     ###############################################################
 
-    def get_move(self, board:GoBoard, color:int):
+    ######################## Pondering ############################
+    def ponder(self, board:GoBoard, stop):
+        '''
+        Search on the opponent's time, until the event stop is set.
+        The opponent is to play on board.
+
+        A short UCB search from the opponent's point of view finds its
+        most likely replies. Then our moves after each of these replies
+        are searched in turns, and their statistics are stored in
+        self.ponder_cache, so that get_move continues from them.
+        '''
+        self.ponder_cache = {}
+        opp_color = board.current_player
+        color = GoBoardUtil.opponent(opp_color)
+        replies = self.root_moves(board, opp_color)
+        if not replies:
+            return
+        reply_stats = self.new_stats(replies)
+        self.run_ucb(board, replies, opp_color, reply_stats,
+                     PONDER_REPLY_SIMS*len(replies), stop)
+
+        searches = []
+        for index in np.argsort(-reply_stats[:, NUM])[:PONDER_REPLIES]:
+            cboard = board.copy()
+            cboard.play_move(replies[index], opp_color)
+            moves = self.root_moves(cboard, color)
+            if len(moves) < 2:
+                continue
+            stats = self.new_stats(moves)
+            self.ponder_cache[position_key(cboard, color)] = (moves, stats)
+            searches.append((cboard, moves, stats))
+
+        while searches and not stop.is_set():
+            for cboard, moves, stats in searches:
+                self.run_ucb(cboard, moves, color, stats, len(moves), stop)
+    ###############################################################
+
+    def get_move(self, board:GoBoard, color:int, stop=None):
         """
         Run one-ply MC simulations to get a move to play.
+        The search ends early once the event stop is set.
         """
-        cboard = board.copy()
-        cboard.current_player = color
-        moves = GoBoardUtil.generate_legal_moves(cboard, color)
+        # a timeout must never return a move of an earlier position
+        self.best_move = None
+        if self.shared is not None:
+            # the workers search with the engine as it was at their start
+            if self.shared.settings != self.search_settings():
+                self.set_workers(self.shared.workers)
+            self.shared.reset()
+        # keep only the pondering results for this position
+        pondered = self.ponder_cache.get(position_key(board, color))
+        self.ponder_cache = {}
+        self.root_stats = None
+        if pondered is not None:
+            moves, stats = pondered
+        else:
+            moves = self.root_moves(board, color)
+            stats = self.new_stats(moves)
 
         # no legal moves left
         if not moves:
             return None
+        # fallback in case time runs out before the first simulation
+        self.best_move = moves[0]
         # only one legal move to play, there is no other choice
-        elif len(moves) == 1:
+        if len(moves) == 1:
             return moves[0]
         # run ucb MC to determine the best move at present
         else:
-            best = self.run_ucb(board, moves, color)
+            # a won endgame is played perfectly without searching
+            if self.tablebase is not None:
+                move = self.tablebase.winning_move(board, color)
+                if move is not None:
+                    return move
+            num_sims = self.num_simulations(board, moves)
+            start = time.time()
+            if self.shared is not None:
+                # the workers continue from the pondered counts
+                prior = stats[:, [NUM, WINS]] if pondered is not None else None
+                best = self.shared.search(board, moves, color, num_sims, stop, prior)
+                self.root_stats = self.shared.counts()
+                done = self.root_stats[:, NUM].sum() - self.shared.prior[:, NUM].sum()
+            else:
+                # kept for get_search_stats, also when the time runs out
+                self.root_stats = stats
+                done = stats[:, NUM].sum()
+                if self.root_search == "halving":
+                    best = self.run_halving(board, moves, color, stats, num_sims, stop)
+                else:
+                    best = self.run_ucb(board, moves, color, stats, num_sims, stop)
+                done = stats[:, NUM].sum() - done
+            self.update_rate(board, done, time.time() - start)
             return best
         
 def run():
@@ -153,7 +569,10 @@ def run():
     start the gtp connection and wait for commands.
     """
     board = GoBoard(7)
-    con = GtpConnection(UCB(sim_num=100), board)
+    policy = PlayoutPolicy.load_default()
+    engine = UCB(sim_num=100, policy=policy, tablebase=Tablebase.load_default())
+    engine.calibrate(board)
+    con = GtpConnection(engine, board)
     con.start_connection()
 
 if __name__ == "__main__":
@@ -0,0 +1,216 @@
+"""
+playout_policy.py
+
+Knowledge-based playout policy for the Monte Carlo players.
+
+Each legal move gets a weight, and playout moves are sampled in
+proportion to these weights. The weight of a move is the product of
+- the weight of the 3x3 pattern around it, looked up by the pattern
+  code that GoBoard maintains incrementally for every point
+- one factor for each binary feature that is present:
+  FILLS_OWN_EYE, REDUCES_OPP_MOVES and SELF_ATARI
+
+All weights are seen from the player to move, so a single table covers
+both colors. The tables are loaded from a .npz weights file with the
+arrays "patterns" (NUM_PATTERNS entries) and "features" (NUM_FEATURES
+entries).
+"""
+
+import os
+import numpy as np
+from board_util import (
+    GoBoardUtil,
+    BLACK,
+    WHITE,
+)
+from board import SURROUNDED_TABLE
+from random_stream import playout_random
+
+"""
+Number of 3x3 pattern codes: 8 surrounding points with 4 colors each
+"""
+NUM_PATTERNS = 4 ** 8
+
+"""
+Binary features of a move
+FILLS_OWN_EYE: all neighbors are stones of the player or border
+REDUCES_OPP_MOVES: the point is also legal for the opponent
+SELF_ATARI: the block of the new stone is left with one liberty
+"""
+FILLS_OWN_EYE = 0
+REDUCES_OPP_MOVES = 1
+SELF_ATARI = 2
+NUM_FEATURES = 3
+
+"""
+Weights file loaded by the players at startup if it exists
+"""
+DEFAULT_WEIGHTS_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "playout_weights.npz"
+)
+
+"""
+Smallest weight allowed in a table, so that every legal move
+keeps a chance to be played
+"""
+MIN_WEIGHT = 1e-6
+
+
+def pattern_color(code, position):
+    """
+    Color of the point at position 0..7 in a pattern code
+    """
+    return (code >> (2 * position)) & 3
+
+
+def swap_colors_table():
+    """
+    Return: numpy array
+    For each pattern code, the code with BLACK and WHITE exchanged.
+    """
+    codes = np.arange(NUM_PATTERNS)
+    swapped = np.zeros(NUM_PATTERNS, dtype=np.int32)
+    for position in range(8):
+        color = pattern_color(codes, position)
+        color = np.where(color == BLACK, WHITE, np.where(color == WHITE, BLACK, color))
+        swapped |= color << (2 * position)
+    return swapped
+
+
+def symmetry_table():
+    """
+    Return: numpy array
+    For each pattern code, the smallest code among its 8 rotations
+    and reflections. Codes with the same entry share one weight
+    when weights are fitted.
+    """
+    # (dx, dy) of each position, see BoardTopology.pattern_offsets
+    position_xy = [(-1, -1), (0, -1), (1, -1), (-1, 0),
+                   (1, 0), (-1, 1), (0, 1), (1, 1)]
+    codes = np.arange(NUM_PATTERNS)
+    canonical = codes.copy()
+    for swap_xy in (False, True):
+        for sx in (1, -1):
+            for sy in (1, -1):
+                transformed = np.zeros(NUM_PATTERNS, dtype=np.int64)
+                for position, (x, y) in enumerate(position_xy):
+                    if swap_xy:
+                        x, y = y, x
+                    target = position_xy.index((sx * x, sy * y))
+                    transformed |= pattern_color(codes, position) << (2 * target)
+                canonical = np.minimum(canonical, transformed)
+    return canonical
+
+
+"""
+Tables computed once at import
+"""
+SWAP_COLORS = swap_colors_table()
+# the center is surrounded by BLACK stones or BORDER, an eye for BLACK
+OWN_EYE = SURROUNDED_TABLE[BLACK]
+
+
+def move_features(board, color, moves):
+    """
+    Return: (codes, features)
+    codes: the pattern codes of the legal moves for color,
+    seen as if color were BLACK.
+    features: the feature bits of the moves, with bit f set
+    if feature f is present.
+    """
+    opp_color = GoBoardUtil.opponent(color)
+    codes = board.pattern_code[moves]
+    if color == WHITE:
+        codes = SWAP_COLORS[codes]
+    features = OWN_EYE[codes] << FILLS_OWN_EYE
+    features |= board.legal[opp_color, moves] << REDUCES_OPP_MOVES
+    features |= board.self_atari[color, moves] << SELF_ATARI
+    return codes, features
+
+
+class PlayoutPolicy(object):
+    def __init__(self, patterns=None, features=None):
+        """
+        Playout policy with given pattern and feature weights.
+        Missing weights default to 1, which gives uniform random playouts.
+
+        Parameters
+        ----------
+        patterns : numpy array
+            NUM_PATTERNS weights, indexed by pattern code with BLACK to play
+        features : numpy array
+            NUM_FEATURES weights
+        """
+        if patterns is None:
+            patterns = np.ones(NUM_PATTERNS)
+        if features is None:
+            features = np.ones(NUM_FEATURES)
+        assert len(patterns) == NUM_PATTERNS
+        assert len(features) == NUM_FEATURES
+        self.patterns = np.maximum(np.asarray(patterns, dtype=np.float64), MIN_WEIGHT)
+        self.features = np.maximum(np.asarray(features, dtype=np.float64), MIN_WEIGHT)
+        self._build_tables()
+
+    @staticmethod
+    def load(filename):
+        """
+        Load a policy from a weights file
+        """
+        with np.load(filename) as data:
+            return PlayoutPolicy(data["patterns"], data["features"])
+
+    @staticmethod
+    def load_default():
+        """
+        Load the policy from DEFAULT_WEIGHTS_FILE.
+        Return None if there is no weights file, for uniform playouts.
+        """
+        if not os.path.exists(DEFAULT_WEIGHTS_FILE):
+            return None
+        return PlayoutPolicy.load(DEFAULT_WEIGHTS_FILE)
+
+    def save(self, filename):
+        np.savez(filename, patterns=self.patterns, features=self.features)
+
+    def _build_tables(self):
+        """
+        Fold all weights into one table per color.
+        The table is indexed by
+            pattern code << 2 | opponent legal << 1 | self atari
+        The eye feature only depends on the pattern code,
+        so it is part of the pattern weight.
+        """
+        pattern = self.patterns * np.where(
+            OWN_EYE, self.features[FILLS_OWN_EYE], 1.0
+        )
+        table = np.empty((NUM_PATTERNS, 4))
+        table[:, 0] = pattern
+        table[:, 1] = pattern * self.features[SELF_ATARI]
+        table[:, 2] = pattern * self.features[REDUCES_OPP_MOVES]
+        table[:, 3] = table[:, 1] * self.features[REDUCES_OPP_MOVES]
+        self.tables = [None, None, None]
+        self.tables[BLACK] = table.ravel()
+        self.tables[WHITE] = table[SWAP_COLORS].ravel()
+
+    def move_weights(self, board, color, moves):
+        """
+        Return: numpy array
+        The weights of the given legal moves for color.
+        """
+        opp_color = GoBoardUtil.opponent(color)
+        index = board.pattern_code[moves] << 2
+        index += board.legal[opp_color, moves] * 2
+        index += board.self_atari[color, moves]
+        return self.tables[color][index]
+
+    def generate_move(self, board, color):
+        """
+        Sample a legal move for color in proportion to its weight.
+        Return PASS if there is no legal move.
+        """
+        if board.num_legal_moves(color) == 0:
+            return None
+        moves = board.get_legal_moves(color)
+        cdf = np.cumsum(self.move_weights(board, color, moves))
+        index = np.searchsorted(cdf, playout_random.random() * cdf[-1], side="right")
+        return moves[index]
@@ -0,0 +1,82 @@
+"""
+random_stream.py
+
+Random numbers for the playouts, drawn in blocks of BLOCK_SIZE from a
+numpy Generator and handed out one by one from the block.
+
+RandomStream.random is the __next__ method of an iterator that chains
+the blocks, so a draw is a single C call without a Python frame, and
+numpy is only called once per block. A stream is reproducible from its
+seed, and spawn derives independent streams for worker processes with
+numpy's SeedSequence, so results do not depend on which worker
+searched what.
+
+playout_random is the stream of the playouts in this process.
+Forked worker processes start with a copy of it and have to reseed it.
+Playouts that run for a wall-clock time, like the calibration of the
+playout rate, draw from a detached stream, so they do not shift it.
+The moves of a seeded player still depend on the time whenever the
+number of simulations does, so reproducible games need a fixed
+simulation count (num_sim) and no pondering.
+"""
+
+import contextlib
+import itertools
+import numpy as np
+
+"""
+Numbers drawn from the Generator at a time
+"""
+BLOCK_SIZE = 4096
+
+
+class RandomStream(object):
+    def __init__(self, seed=None):
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        """
+        Restart the stream from seed: an int, a sequence of ints,
+        a SeedSequence, or None for fresh entropy from the OS
+        """
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_sequence = seed
+        generator = np.random.Generator(np.random.PCG64(seed))
+        blocks = iter(lambda: generator.random(BLOCK_SIZE).tolist(), None)
+        # random() returns the next float in [0, 1)
+        self.random = itertools.chain.from_iterable(blocks).__next__
+
+    @contextlib.contextmanager
+    def detached(self, seed=None):
+        """
+        Draw from a separate stream started from seed inside the with
+        block, and continue this stream where it was afterwards
+        """
+        saved = self.random, self.seed_sequence
+        self.seed(seed)
+        try:
+            yield self
+        finally:
+            self.random, self.seed_sequence = saved
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def shuffle(self, items):
+        """
+        Shuffle the list items in place
+        """
+        for i in range(len(items) - 1, 0, -1):
+            j = int(self.random() * (i + 1))
+            items[i], items[j] = items[j], items[i]
+
+    def spawn(self, n):
+        """
+        Return SeedSequences of n independent streams. For the same
+        seed, the k-th call returns the same seeds.
+        """
+        return self.seed_sequence.spawn(n)
+
+
+playout_random = RandomStream()
@@ -0,0 +1,230 @@
+"""
+shared_search.py
+
+Root-parallel flat Monte Carlo search over shared memory.
+
+The GTP process and the worker processes share one block of memory
+(multiprocessing.shared_memory) with
+- a header: sequence number of the current search, the sequence number
+  of the last stopped search, shutdown flag, color to play, number of
+  root moves and length of the position
+- the position, encoded with GoBoard.to_bytes, and the root moves
+- per worker: the sequence number its results belong to, and the
+  visit and win counts of every root move
+
+For each genmove the GTP process writes the position and the root moves,
+then increments the sequence number. Workers poll the sequence number
+while idle, run UCB on their own statistics, and copy their visit and
+win counts into their own rows after every simulation. There is no
+message passing per simulation, and since every row has a single
+writer, the GTP process reads the results without locks. Counts of a
+worker that has not picked up the current search yet are ignored.
+
+Every worker runs UCB. Sequential halving needs all workers to finish a
+round before the next one starts, so the engine does not combine it
+with workers. The counts of an earlier search of the position, like
+the ones from pondering, are added to the counts of the workers as a
+prior, and do not count against the simulation budget.
+
+Forked workers search with a copy of the engine as it was when they
+started. The engine compares its search settings with the ones the
+workers started with before every search, and restarts them if the
+settings changed.
+"""
+
+import atexit
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+from board import GoBoard
+from board_util import MAXSIZE
+from random_stream import playout_random
+
+"""
+Header fields
+"""
+SEQ, STOPPED, SHUTDOWN, COLOR, NUM_MOVES, POSITION_LEN = range(6)
+HEADER_FIELDS = 6
+
+"""
+Room for the largest position and root move list
+"""
+POSITION_BYTES = 6 + (MAXSIZE * MAXSIZE + 3) // 4
+MAX_MOVES = MAXSIZE * MAXSIZE
+
+"""
+Seconds between two checks of the sequence number by an idle worker,
+and by the GTP process waiting for the results
+"""
+POLL_INTERVAL = 0.001
+
+
+class SharedBuffers(object):
+    def __init__(self, shm, workers):
+        """
+        numpy views of the fields in the shared memory shm
+        """
+        offset = 0
+        self.header = np.ndarray(HEADER_FIELDS, dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.header.nbytes
+        self.stamps = np.ndarray(workers, dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.stamps.nbytes
+        self.results = np.ndarray(
+            (workers, MAX_MOVES, 2), dtype=np.int64, buffer=shm.buf, offset=offset
+        )
+        offset += self.results.nbytes
+        self.moves = np.ndarray(MAX_MOVES, dtype=np.int32, buffer=shm.buf, offset=offset)
+        offset += self.moves.nbytes
+        self.position = np.ndarray(POSITION_BYTES, dtype=np.uint8, buffer=shm.buf, offset=offset)
+
+    @staticmethod
+    def nbytes(workers):
+        return 8 * HEADER_FIELDS + 8 * workers + 16 * workers * MAX_MOVES \
+            + 4 * MAX_MOVES + POSITION_BYTES
+
+
+def worker_main(name, index, workers, engine, seed):
+    """
+    Search loop of worker index, using the shared memory called name.
+    engine is a UCB player with the search parameters, and seed the
+    SeedSequence of the worker's playout stream.
+    """
+    # forked workers start with the random state of the parent
+    playout_random.seed(seed)
+    shm = shared_memory.SharedMemory(name=name)
+    buffers = SharedBuffers(shm, workers)
+    header = buffers.header
+    row = buffers.results[index]
+    done = 0
+    try:
+        while not header[SHUTDOWN]:
+            seq = header[SEQ]
+            if seq == done or header[STOPPED] == seq:
+                time.sleep(POLL_INTERVAL)
+                continue
+            color = int(header[COLOR])
+            num_moves = int(header[NUM_MOVES])
+            board = GoBoard.from_bytes(buffers.position[: header[POSITION_LEN]].tobytes())
+            moves = [int(move) for move in buffers.moves[:num_moves]]
+            if header[SEQ] != seq:
+                # a newer search was published while we read this one
+                continue
+            done = seq
+            row[:num_moves] = 0
+            buffers.stamps[index] = seq
+            stats = engine.new_stats(moves)
+            while header[STOPPED] != seq and header[SEQ] == seq:
+                engine.run_ucb(board, moves, color, stats, 1)
+                row[:num_moves] = stats[:, :2]
+    finally:
+        del buffers, header, row
+        shm.close()
+
+
+class SharedSearch(object):
+    def __init__(self, engine, workers):
+        """
+        Start workers processes that search for engine,
+        with independent playout streams spawned from playout_random.
+        self.settings are the search settings of engine at the start.
+        """
+        self.workers = workers
+        self.settings = engine.search_settings()
+        self.shm = shared_memory.SharedMemory(create=True, size=SharedBuffers.nbytes(workers))
+        self.buffers = SharedBuffers(self.shm, workers)
+        self.buffers.header[:] = 0
+        self.buffers.stamps[:] = 0
+        self.moves = []
+        self.prior = np.zeros((0, 2), dtype=np.int64)
+        seeds = playout_random.spawn(workers)
+        self.processes = [
+            multiprocessing.Process(
+                target=worker_main,
+                args=(self.shm.name, index, workers, engine, seeds[index]),
+                daemon=True,
+            )
+            for index in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+        atexit.register(self.close)
+
+    def start(self, board, moves, color, prior=None):
+        """
+        Publish the position on board and its root moves to the workers.
+        prior holds visit and win counts of the root moves from an
+        earlier search, added to the counts of the workers.
+        """
+        header = self.buffers.header
+        data = board.to_bytes()
+        self.buffers.position[: len(data)] = np.frombuffer(data, dtype=np.uint8)
+        self.buffers.moves[: len(moves)] = moves
+        header[COLOR] = color
+        header[NUM_MOVES] = len(moves)
+        header[POSITION_LEN] = len(data)
+        self.moves = list(moves)
+        self.prior = np.zeros((len(moves), 2), dtype=np.int64)
+        if prior is not None:
+            self.prior[:] = prior
+        # written last, the workers start when they see it
+        header[SEQ] += 1
+
+    def reset(self):
+        """
+        Forget the root moves of the last search
+        """
+        self.moves = []
+        self.prior = np.zeros((0, 2), dtype=np.int64)
+
+    def stop(self):
+        self.buffers.header[STOPPED] = self.buffers.header[SEQ]
+
+    def counts(self):
+        """
+        Visit and win counts of the root moves summed over the prior
+        and the workers that are searching the current position
+        """
+        seq = self.buffers.header[SEQ]
+        current = self.buffers.stamps == seq
+        return self.buffers.results[current, : len(self.moves)].sum(axis=0) + self.prior
+
+    def best_move(self):
+        """
+        The root move with the most visits so far, or None before a search
+        """
+        if not self.moves:
+            return None
+        return self.moves[int(np.argmax(self.counts()[:, 0]))]
+
+    def search(self, board, moves, color, num_sims, stop=None, prior=None):
+        """
+        Search until the workers have run num_sims simulations in total,
+        the event stop is set, or no worker is alive anymore.
+        Return the root move with the most visits, prior included.
+        """
+        self.start(board, moves, color, prior)
+        total = num_sims + self.prior[:, 0].sum()
+        try:
+            while self.counts()[:, 0].sum() < total:
+                if stop is not None and stop.is_set():
+                    break
+                if not any(process.is_alive() for process in self.processes):
+                    break
+                time.sleep(POLL_INTERVAL)
+        finally:
+            self.stop()
+        return self.best_move()
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.buffers.header[SHUTDOWN] = 1
+        for process in self.processes:
+            process.join()
+        self.buffers = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        atexit.unregister(self.close)
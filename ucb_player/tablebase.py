@@ -0,0 +1,358 @@
+#!/usr/bin/python3
+# /usr/bin/python3
+# Set the path to your python3 above
+
+"""
+tablebase.py
+
+Endgame tablebase: exact results of NoGo positions with few legal
+moves left, where both players together have at most a threshold of
+legal moves. Moves only become illegal in NoGo, so once a game is
+below the threshold, it stays below.
+
+    python3 tablebase.py generate --games 2000 --threshold 16
+    python3 tablebase.py probe C3 D4 E2 ...
+
+Positions are stored once for all 8 symmetries of the board, by a
+64 bit hash of the smallest of their color arrays and the player to
+move. The tablebase file is an open addressing hash table with linear
+probing:
+    a header: magic, board size, threshold, number of slots
+    slots of (key, result), key 0 for an empty slot and result
+    WIN or LOSS for the player to move
+Tablebase.load opens it read-only as a numpy memmap, so the players
+share the pages of the file and start without reading it.
+
+A 7x7 endgame below the threshold still has too many positions to
+enumerate, and random games rarely meet the positions of another game.
+So positions that are not in the file are solved when they are reached,
+with early stops from GoBoard.decided_winner, and kept in memory: one
+solve in a game answers all later moves of the game. generate fills
+the file with the solved endgames of random games, without filling own
+eyes, played in a pool of worker processes.
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import struct
+import sys
+import numpy as np
+
+from board import GoBoard
+from board_util import GoBoardUtil, coord_to_point
+from gtp_connection import move_to_coord, point_to_coord, format_point
+from random_stream import playout_random
+
+"""
+Tablebase file loaded by the players at startup if it exists
+"""
+DEFAULT_TABLEBASE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "tablebase.bin"
+)
+
+"""
+Most legal moves for both players of the positions the players solve,
+if there is no tablebase file. Solving takes up to about 0.1 seconds
+at 16 on 7x7, and about 4 times longer for every 2 more moves.
+"""
+DEFAULT_THRESHOLD = 16
+
+"""
+Node limits of one solve while playing and in generate,
+the position is left to the search beyond
+"""
+PLAY_NODES = 20000
+GENERATE_NODES = 200000
+
+"""
+Positions solved while playing are forgotten beyond this number
+"""
+MAX_SOLVED = 1000000
+
+MAGIC = b"NOGOTB01"
+HEADER = struct.Struct("<8sBB6xQ")
+SLOT = np.dtype([("key", "<u8"), ("result", "u1")])
+
+"""
+Results of the player to move, 0 is an empty slot
+"""
+LOSS = 1
+WIN = 2
+
+"""
+Largest share of used slots in a written table
+"""
+MAX_LOAD = 0.5
+
+
+class SolverLimit(Exception):
+    pass
+
+
+def position_hash(board, color):
+    """
+    Key of the position on board with color to play,
+    the same for all symmetries of the position. Never 0.
+    """
+    size = board.size
+    grid = board.board[board.topology.points].reshape(size, size)
+    smallest = None
+    for turns in range(4):
+        rotated = np.rot90(grid, turns)
+        for image in (rotated, rotated[:, ::-1]):
+            data = image.tobytes()
+            if smallest is None or data < smallest:
+                smallest = data
+    digest = hashlib.blake2b(smallest + bytes([color]), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+def num_legal(board):
+    color = board.current_player
+    return board.num_legal_moves(color) + board.num_legal_moves(GoBoardUtil.opponent(color))
+
+
+class Tablebase(object):
+    def __init__(self, size, threshold, table=None):
+        """
+        Exact results of the positions of one board size with at most
+        threshold legal moves for both players together.
+        table is an array of SLOT from a tablebase file, its length a
+        power of two, or None. self.solved holds the results solved
+        since, by position_hash.
+        """
+        self.size = size
+        self.threshold = threshold
+        self.table = table
+        if table is not None:
+            self.keys = table["key"]
+            self.results = table["result"]
+            self.mask = len(table) - 1
+        self.solved = {}
+
+    @staticmethod
+    def load(filename):
+        with open(filename, "rb") as f:
+            magic, size, threshold, num_slots = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("not a tablebase file: {}".format(filename))
+        table = np.memmap(filename, dtype=SLOT, mode="r", offset=HEADER.size, shape=(num_slots,))
+        return Tablebase(size, threshold, table)
+
+    @staticmethod
+    def load_default(size=7):
+        """
+        Load the tablebase from DEFAULT_TABLEBASE_FILE if it exists
+        for size, otherwise return an empty one with DEFAULT_THRESHOLD
+        """
+        if os.path.exists(DEFAULT_TABLEBASE_FILE):
+            tablebase = Tablebase.load(DEFAULT_TABLEBASE_FILE)
+            if tablebase.size == size:
+                return tablebase
+        return Tablebase(size, DEFAULT_THRESHOLD)
+
+    def save(self, filename):
+        """
+        Write the results of the table and the solved positions
+        to a tablebase file
+        """
+        results = dict(self.solved)
+        if self.table is not None:
+            for slot in np.flatnonzero(self.keys):
+                results[int(self.keys[slot])] = self.results[slot] == WIN
+        num_slots = 1
+        while num_slots * MAX_LOAD < max(len(results), 1):
+            num_slots *= 2
+        # filled as python lists, numpy rounds keys above 2^63 in tuples
+        keys = [0] * num_slots
+        values = np.zeros(num_slots, dtype=np.uint8)
+        mask = num_slots - 1
+        for key, win in results.items():
+            slot = key & mask
+            while keys[slot] != 0:
+                slot = (slot + 1) & mask
+            keys[slot] = key
+            values[slot] = WIN if win else LOSS
+        table = np.zeros(num_slots, dtype=SLOT)
+        table["key"] = np.array(keys, dtype=np.uint64)
+        table["result"] = values
+        with open(filename, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.size, self.threshold, num_slots))
+            f.write(table.tobytes())
+
+    def __len__(self):
+        stored = 0 if self.table is None else int(np.count_nonzero(self.keys))
+        return stored + len(self.solved)
+
+    def covers(self, board):
+        return board.size == self.size and num_legal(board) <= self.threshold
+
+    def lookup_key(self, key):
+        """
+        Return whether the player to move wins the position with
+        position_hash key, None if it is not known
+        """
+        if key in self.solved:
+            return self.solved[key]
+        if self.table is None:
+            return None
+        slot = key & self.mask
+        while True:
+            stored = int(self.keys[slot])
+            if stored == key:
+                return self.results[slot] == WIN
+            if stored == 0:
+                return None
+            slot = (slot + 1) & self.mask
+
+    def lookup(self, board, color):
+        return self.lookup_key(position_hash(board, color))
+
+    def solve(self, board, nodes, max_nodes):
+        """
+        Return whether the player to move on board wins.
+        nodes counts the searched positions, raises SolverLimit
+        after max_nodes.
+        """
+        color = board.current_player
+        key = position_hash(board, color)
+        win = self.lookup_key(key)
+        if win is not None:
+            return win
+        nodes[0] += 1
+        if nodes[0] > max_nodes:
+            raise SolverLimit()
+        winner = board.decided_winner()
+        if winner is not None:
+            win = winner == color
+        else:
+            win = False
+            for move in board.get_legal_moves(color):
+                child = board.copy()
+                child.play_move(move, color)
+                if not self.solve(child, nodes, max_nodes):
+                    win = True
+                    break
+        self.solved[key] = win
+        return win
+
+    def solve_root(self, board, color, max_nodes=PLAY_NODES):
+        """
+        Return: (whether color to play on board wins, a winning move
+        or None), or None if the solve gives up after max_nodes
+        """
+        if len(self.solved) > MAX_SOLVED:
+            self.solved = {}
+        board = board.copy()
+        board.current_player = color
+        nodes = [0]
+        try:
+            for move in board.get_legal_moves(color):
+                child = board.copy()
+                child.play_move(move, color)
+                if not self.solve(child, nodes, max_nodes):
+                    return True, move
+            return False, None
+        except SolverLimit:
+            return None
+
+    def winning_move(self, board, color, max_nodes=PLAY_NODES):
+        """
+        Return a move of color that wins against any defense, None if
+        the position is not covered, lost, or too large to solve
+        """
+        if not self.covers(board):
+            return None
+        solved = self.solve_root(board, color, max_nodes)
+        if solved is None:
+            return None
+        return solved[1]
+
+def generate_job(job):
+    """
+    Play random games and solve their endgames below threshold.
+    Runs in a worker process. Returns the solved positions.
+    """
+    size, threshold, games, seed = job
+    playout_random.seed(seed)
+    tablebase = Tablebase(size, threshold)
+    for _ in range(games):
+        board = GoBoard(size)
+        while num_legal(board) > threshold:
+            color = board.current_player
+            move = GoBoardUtil.generate_random_move(board, color, use_eye_filter=True)
+            if move is None:
+                break
+            board.play_move(move, color)
+        try:
+            tablebase.solve(board, [0], GENERATE_NODES)
+        except SolverLimit:
+            # the positions solved so far are kept
+            pass
+    return tablebase.solved
+
+
+def generate(args):
+    jobs = []
+    for start in range(0, args.games, args.batch):
+        games = min(args.batch, args.games - start)
+        jobs.append((args.size, args.threshold, games, args.seed + start))
+    tablebase = Tablebase(args.size, args.threshold)
+    done = 0
+    with multiprocessing.Pool(args.workers) as pool:
+        for solved in pool.imap_unordered(generate_job, jobs):
+            tablebase.solved.update(solved)
+            done += 1
+            print("{} / {} batches, {} positions".format(done, len(jobs), len(tablebase)),
+                  file=sys.stderr, flush=True)
+    tablebase.save(args.output)
+    print("wrote {} positions to {}".format(len(tablebase), args.output))
+
+
+def probe(args):
+    tablebase = Tablebase.load(args.file)
+    board = GoBoard(tablebase.size)
+    for move in args.moves:
+        color = board.current_player
+        coord = move_to_coord(move, board.size)
+        if coord is None or not board.play_move(coord_to_point(coord[0], coord[1], board.size), color):
+            sys.exit("illegal move {}".format(move))
+    color = board.current_player
+    if not tablebase.covers(board):
+        print("{} legal moves, above the threshold {}".format(num_legal(board), tablebase.threshold))
+        return
+    win = tablebase.lookup(board, color)
+    print({None: "not in the table", True: "win", False: "loss"}[win])
+    move = tablebase.winning_move(board, color)
+    if move is not None:
+        print(format_point(point_to_coord(move, board.size)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NoGo endgame tablebase")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="solve the endgames of random games")
+    gen.add_argument("--size", type=int, default=7)
+    gen.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                     help="solve positions with at most this many legal moves")
+    gen.add_argument("--games", type=int, default=1000)
+    gen.add_argument("--batch", type=int, default=50, help="games per worker job")
+    gen.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    gen.add_argument("--seed", type=int, default=0)
+    gen.add_argument("--output", default=DEFAULT_TABLEBASE_FILE)
+    gen.set_defaults(run=generate)
+
+    prb = commands.add_parser("probe", help="look up the position after a move list")
+    prb.add_argument("moves", nargs="*")
+    prb.add_argument("--file", default=DEFAULT_TABLEBASE_FILE)
+    prb.set_defaults(run=probe)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/python3
+# /usr/bin/python3
+# Set the path to your python3 above
+
+"""
+tune_policy.py
+
+Offline tuning of the playout policy weights from self-play.
+
+    python3 tune_policy.py selfplay --games 1000 --out selfplay.log
+    python3 tune_policy.py fit selfplay.log --out playout_weights.npz
+
+selfplay runs games in parallel worker processes and appends every
+position to a move log. The default players are two UCB engines;
+--opponent random plays against uniformly random legal moves from
+GoBoardUtil.generate_random_move, in the same process.
+Only moves of the UCB engine are logged.
+
+fit estimates the weights with the minorization-maximization (MM)
+algorithm for generalized Bradley-Terry models: each logged position
+is a competition between its legal moves, won by the chosen move.
+Every iteration is one streaming pass over the logs.
+Pattern weights are shared between the 8 symmetric versions of a pattern.
+Writing the result to playout_weights.npz in this directory makes
+the UCB player load it at startup.
+
+Move log format: the 8 byte header LOG_MAGIC, followed by one 4 byte
+row per legal move of each logged position:
+    pattern code (uint16, color to play seen as BLACK)
+    feature bits (uint8)
+    flags (uint8): ROW_CHOSEN for the move that was played,
+                   ROW_FIRST for the first move of a position
+"""
+
+import argparse
+import multiprocessing
+import numpy as np
+
+from board import GoBoard
+from board_util import GoBoardUtil
+from nogo_ucb import UCB
+from random_stream import playout_random
+from playout_policy import (
+    PlayoutPolicy,
+    move_features,
+    symmetry_table,
+    NUM_FEATURES,
+    NUM_PATTERNS,
+)
+
+LOG_MAGIC = b"NOGOLOG1"
+LOG_ROW = np.dtype([("code", "<u2"), ("features", "u1"), ("flags", "u1")])
+ROW_CHOSEN = 1
+ROW_FIRST = 2
+
+"""
+Number of rows read from a log at a time
+"""
+CHUNK_ROWS = 1 << 20
+
+
+def position_rows(board, color, move):
+    """
+    Return: numpy array of LOG_ROW
+    The rows for the position on board with color to play,
+    where move was chosen.
+    """
+    moves = board.get_legal_moves(color)
+    codes, features = move_features(board, color, moves)
+    rows = np.zeros(len(moves), dtype=LOG_ROW)
+    rows["code"] = codes
+    rows["features"] = features
+    rows["flags"][moves == move] = ROW_CHOSEN
+    rows["flags"][0] |= ROW_FIRST
+    return rows
+
+
+def selfplay_game(args):
+    """
+    Play one game and return the log rows of its positions as bytes.
+    Runs in a worker process.
+    """
+    seed, size, sims, opponent = args
+    playout_random.seed(seed)
+    engine = UCB(sim_num=sims, policy=PlayoutPolicy.load_default())
+    board = GoBoard(size)
+    # the random opponent plays the color given by the seed
+    random_color = 1 + seed % 2 if opponent == "random" else None
+    rows = []
+    while True:
+        color = board.current_player
+        if board.num_legal_moves(color) == 0:
+            break
+        if color == random_color:
+            move = GoBoardUtil.generate_random_move(board, color)
+        else:
+            move = engine.get_move(board, color)
+            rows.append(position_rows(board, color, move))
+        board.play_move(move, color)
+    if not rows:
+        return b""
+    return np.concatenate(rows).tobytes()
+
+
+def selfplay(games, workers, size, sims, opponent, out, seed):
+    """
+    Run games in a pool of worker processes and append them to the log out.
+    """
+    with open(out, "ab") as f:
+        if f.tell() == 0:
+            f.write(LOG_MAGIC)
+        jobs = [(seed + i, size, sims, opponent) for i in range(games)]
+        with multiprocessing.Pool(workers) as pool:
+            for count, data in enumerate(pool.imap_unordered(selfplay_game, jobs), 1):
+                f.write(data)
+                if count % 100 == 0 or count == games:
+                    print("{} / {} games".format(count, games), flush=True)
+
+
+def read_positions(filename):
+    """
+    Stream the log filename in chunks of whole positions.
+    Yields numpy arrays of LOG_ROW which start at a ROW_FIRST row.
+    """
+    with open(filename, "rb") as f:
+        if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError("not a move log: {}".format(filename))
+        pending = np.zeros(0, dtype=LOG_ROW)
+        while True:
+            chunk = np.fromfile(f, dtype=LOG_ROW, count=CHUNK_ROWS)
+            if len(chunk) == 0:
+                break
+            chunk = np.concatenate([pending, chunk])
+            starts = np.flatnonzero(chunk["flags"] & ROW_FIRST)
+            # keep the last position, it can continue in the next chunk
+            cut = starts[-1] if len(starts) else 0
+            pending = chunk[cut:]
+            if cut > 0:
+                yield chunk[:cut]
+        if len(pending):
+            yield pending
+
+
+class MMFitter(object):
+    def __init__(self):
+        """
+        Minorization-maximization for the pattern and feature weights.
+        Each weight has a prior of one virtual win and one virtual loss
+        against a weight of 1, so unseen patterns keep weight 1.
+        """
+        self.classes = symmetry_table()
+        self.patterns = np.ones(NUM_PATTERNS)
+        self.features = np.ones(NUM_FEATURES)
+
+    def _start_pass(self):
+        self.pattern_wins = np.zeros(NUM_PATTERNS)
+        self.pattern_sums = np.zeros(NUM_PATTERNS)
+        self.feature_wins = np.zeros(NUM_FEATURES)
+        self.feature_sums = np.zeros(NUM_FEATURES)
+        self.log_likelihood = 0.0
+        self.num_positions = 0
+
+    def _add_positions(self, rows):
+        """
+        Accumulate the MM statistics of a chunk of positions
+        """
+        position = np.cumsum((rows["flags"] & ROW_FIRST) != 0) - 1
+        num_positions = position[-1] + 1
+        pattern = self.classes[rows["code"]]
+        bits = [(rows["features"] >> f) & 1 != 0 for f in range(NUM_FEATURES)]
+        chosen = (rows["flags"] & ROW_CHOSEN) != 0
+
+        strength = self.patterns[pattern].copy()
+        for f in range(NUM_FEATURES):
+            strength[bits[f]] *= self.features[f]
+        total = np.bincount(position, weights=strength, minlength=num_positions)
+        # strength over total strength of the position
+        share = strength / total[position]
+
+        self.pattern_wins += np.bincount(pattern[chosen], minlength=NUM_PATTERNS)
+        self.pattern_sums += np.bincount(
+            pattern, weights=share / self.patterns[pattern], minlength=NUM_PATTERNS
+        )
+        for f in range(NUM_FEATURES):
+            self.feature_wins[f] += np.count_nonzero(bits[f] & chosen)
+            self.feature_sums[f] += share[bits[f]].sum() / self.features[f]
+        self.log_likelihood += np.log(share[chosen]).sum()
+        self.num_positions += num_positions
+
+    def iterate(self, filenames):
+        """
+        One streaming pass over the logs, followed by the MM update.
+        Return the average log-likelihood of the chosen moves
+        under the weights before the update.
+        """
+        self._start_pass()
+        for filename in filenames:
+            for rows in read_positions(filename):
+                self._add_positions(rows)
+        if self.num_positions == 0:
+            raise ValueError("no positions in the logs")
+        self.patterns = (self.pattern_wins + 1) / (
+            self.pattern_sums + 2 / (self.patterns + 1)
+        )
+        self.features = (self.feature_wins + 1) / (
+            self.feature_sums + 2 / (self.features + 1)
+        )
+        return self.log_likelihood / self.num_positions
+
+    def policy(self):
+        return PlayoutPolicy(self.patterns[self.classes], self.features)
+
+
+def fit(filenames, iterations, out):
+    fitter = MMFitter()
+    for i in range(iterations):
+        log_likelihood = fitter.iterate(filenames)
+        print("iteration {}: log-likelihood {:.4f} over {} positions".format(
+            i + 1, log_likelihood, fitter.num_positions), flush=True)
+    fitter.policy().save(out)
+    print("features:", fitter.features)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune playout policy weights")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    play = commands.add_parser("selfplay", help="generate a move log")
+    play.add_argument("--games", type=int, default=100)
+    play.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    play.add_argument("--size", type=int, default=7)
+    play.add_argument("--sims", type=int, default=10,
+                      help="simulations per move of the UCB engine")
+    play.add_argument("--opponent", choices=["ucb", "random"], default="ucb")
+    play.add_argument("--seed", type=int, default=0)
+    play.add_argument("--out", default="selfplay.log")
+
+    weights = commands.add_parser("fit", help="fit weights to move logs")
+    weights.add_argument("logs", nargs="+")
+    weights.add_argument("--iterations", type=int, default=20)
+    weights.add_argument("--out", default="playout_weights.npz")
+
+    args = parser.parse_args()
+    if args.command == "selfplay":
+        selfplay(args.games, args.workers, args.size, args.sims,
+                 args.opponent, args.out, args.seed)
+    else:
+        fit(args.logs, args.iterations, args.out)
+
+
+if __name__ == "__main__":
+    main()